@@ -1,22 +1,48 @@
+import time
+STARTUP_T0 = time.perf_counter()
+
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import datetime
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from nltk.sentiment import SentimentIntensityAnalyzer
-import nltk
 from tkinter.font import Font
+import psihoz_db
+import psihoz_perf
+from psihoz_backup import BackupService
+from psihoz_cache import EntryCache
+from psihoz_db import MOODS, parse_date
+from psihoz_worker import DbWorker
+
+# pandas, matplotlib и nltk импортируются при первом использовании
+# (вкладка «Аналитика», первое сохранение), чтобы окно появлялось сразу.
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "nltk")
+
+# Отчёт о времени запуска: PSIHOZ_STARTUP_REPORT=1 python PSIHOZ.py
+STARTUP_BUDGET_MS = 300
+
+# Параметры виртуальной таблицы истории
+HISTORY_PAGE_SIZE = 50      # строк за один запрос (видимая область + запас)
+HISTORY_MAX_PAGES = 4       # сколько страниц одновременно держим в таблице
+HISTORY_PREFETCH = 0.1      # доля прокрутки у края, при которой грузим страницу
+NOTE_PREVIEW_LEN = 200      # в таблицу попадает только начало заметки
+
+# Поиск по истории
+SEARCH_DEBOUNCE_MS = 200    # пауза после ввода перед запросом
+SEARCH_LIMIT = 100
+
+# Индикатор тональности заметки при наборе
+LIVE_SENTIMENT_DEBOUNCE_MS = 300
 
-# Инициализация NLP
-try:
-    nltk.data.find('vader_lexicon')
-except:
-    nltk.download('vader_lexicon')
+DB_PATH = 'psihoz.db'
+WORKER_POLL_MS = 50         # период опроса результатов фонового потока
+
+# Скрытая панель диагностики (Ctrl+Shift+D): задержки обработчиков
+DIAGNOSTICS_REFRESH_MS = 1000
 
 class PsihozApp:
     def __init__(self, root):
+        self.startup_marks = [("imports", time.perf_counter())]
         self.root = root
         self.root.title("Psihoz - Дневник психического здоровья")
         self.root.geometry("1000x750")
@@ -35,25 +61,62 @@ class PsihozApp:
         self.accent_color = "#80815A"
         self.text_dark = "#333333"
 
-        # Шрифты
-        self.title_font = Font(family="Arial", size=18, weight="bold")
-        self.subtitle_font = Font(family="Arial", size=14, weight="bold")
-        self.text_font = Font(family="Arial", size=12)
-        self.small_font = Font(family="Arial", size=11)
-
-        # Инициализация анализатора настроения
-        self.sia = SentimentIntensityAnalyzer()
+        # Шрифты: один объект Font на набор параметров (см. font())
+        self.fonts = {}
+        self.title_font = self.font(size=18, weight="bold")
+        self.subtitle_font = self.font(size=14, weight="bold")
+        self.text_font = self.font(size=12)
+        self.small_font = self.font(size=11)
 
-        # Подключение к базе данных
-        self.conn = sqlite3.connect('psihoz.db')
+        # Подключение к базе данных (все запросы идут через фоновый поток)
+        self.worker = DbWorker(DB_PATH, on_error=self.on_commit_error)
+        # Колоночный кэш записей для истории и аналитики (живёт в потоке worker)
+        self.entry_cache = EntryCache(NOTE_PREVIEW_LEN)
+        self.rescore_progress = None
+        self.backup_progress = None
+        self.sync_running = False
         self.create_tables()
+        # Резервные копии по расписанию (psihoz_backup), своим соединением
+        self.backup_service = BackupService(DB_PATH)
+        self.backup_service.start()
 
         # Создание интерфейса
         self.configure_styles()
         self.create_widgets()
+        self.startup_marks.append(("widgets", time.perf_counter()))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_worker()
 
-        # Загрузка данных пользователя
-        self.load_data()
+        # Столбцы кэша записей читаются в фоне, пока пользователь на первой вкладке
+        self.worker.submit(self.entry_cache.refresh, channel="cache", error=self.on_worker_error)
+
+        self.startup_marks.append(("init", time.perf_counter()))
+        self.root.after_idle(self.on_first_frame)
+
+    def font(self, family="Arial", size=12, weight="normal", underline=False):
+        # Общий кэш шрифтов: виджеты с одинаковым шрифтом делят один объект Tk
+        key = (family, size, weight, underline)
+        if key not in self.fonts:
+            self.fonts[key] = Font(family=family, size=size, weight=weight, underline=underline)
+        return self.fonts[key]
+
+    def on_first_frame(self):
+        self.root.update_idletasks()
+        self.startup_marks.append(("first frame", time.perf_counter()))
+        if os.environ.get("PSIHOZ_STARTUP_REPORT"):
+            self.report_startup()
+
+    def report_startup(self):
+        # Время от старта процесса до каждого этапа и загруженные тяжёлые модули
+        lines = ["Запуск Psihoz:"]
+        for name, moment in self.startup_marks:
+            lines.append(f"  {name}: {(moment - STARTUP_T0) * 1000:.0f} мс")
+        total = (self.startup_marks[-1][1] - STARTUP_T0) * 1000
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        lines.append(f"  тяжёлые модули: {', '.join(loaded) or 'нет'}")
+        if total > STARTUP_BUDGET_MS:
+            lines.append(f"  ПРЕВЫШЕН БЮДЖЕТ: {total:.0f} мс > {STARTUP_BUDGET_MS} мс")
+        print("\n".join(lines), file=sys.stderr)
 
     def configure_styles(self):
         # Настройка стилей
@@ -102,18 +165,43 @@ class PsihozApp:
                  foreground=[('selected', self.text_color)])
 
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                mood TEXT NOT NULL,
-                note TEXT,
-                symptoms TEXT,
-                sentiment_score REAL
-            )
-        ''')
-        self.conn.commit()
+        # Создание таблиц и миграция старых файлов psihoz.db
+        self.worker.submit(psihoz_db.migrate, error=self.on_worker_error)
+
+    def on_worker_error(self, e):
+        messagebox.showerror("Ошибка", f"Ошибка базы данных: {str(e)}")
+
+    def on_commit_error(self, e):
+        # Записи остаются в очереди на commit, повтор — автоматически
+        messagebox.showerror("Ошибка", f"Не удалось записать изменения в базу: {str(e)}\n"
+                                       f"Повторная попытка будет выполнена автоматически.")
+
+    def poll_worker(self):
+        # Доставка результатов фонового потока и индикатор занятости
+        self.worker.poll()
+        if self.rescore_progress is not None:
+            done, total = self.rescore_progress
+            self.busy_label.config(text=f"⏳ Пересчёт тональности: {done}/{total}")
+        elif self.backup_progress is not None:
+            done, total = self.backup_progress
+            self.busy_label.config(text=f"⏳ Резервная копия: {done * 100 // max(total, 1)}%")
+        elif self.worker.busy():
+            self.busy_label.config(text="⏳ Загрузка...")
+        else:
+            self.busy_label.config(text="")
+        self.root.after(WORKER_POLL_MS, self.poll_worker)
+
+    def on_close(self):
+        # Ожидание без срока: отложенные записи должны попасть на диск.
+        # Идущая резервная копия прерывается, её временный файл удаляется.
+        self.backup_service.stop()
+        self.worker.stop()
+        if self.worker.exit_error is not None:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить последние изменения: "
+                                           f"{str(self.worker.exit_error)}")
+        for path in psihoz_perf.dump_profiles():
+            print(f"Профиль сохранён: {path}", file=sys.stderr)
+        self.root.destroy()
 
     def create_widgets(self):
         # Главный контейнер
@@ -140,21 +228,55 @@ class PsihozApp:
                                 fg=self.text_dark)
         subtitle_label.pack(side=tk.LEFT, padx=10)
 
+        # Индикатор фоновой работы
+        self.busy_label = tk.Label(header_frame,
+                                   text="",
+                                   font=self.small_font,
+                                   bg=self.bg_color,
+                                   fg=self.accent_color)
+        self.busy_label.pack(side=tk.RIGHT)
+
         # Notebook для разделов
         self.notebook = ttk.Notebook(main_container)
         self.notebook.pack(fill=tk.BOTH, expand=True)
 
-        # Вкладка "Новая запись"
+        # Вкладка "Новая запись" открыта при запуске и строится сразу.
+        # Остальные — пустые рамки; содержимое (и matplotlib) создаётся
+        # при первом выборе вкладки, см. on_tab_changed.
+        self.tab_builders = {}
+        self.history_ready = False
+        self.analytics_ready = False
+        self.analytics_version = None   # версия данных на графиках аналитики
+        self.symptoms_ready = False
         self.create_new_entry_tab()
+        self.history_tab = self.add_lazy_tab("📜 История", self.create_history_tab)
+        self.analytics_tab = self.add_lazy_tab("📊 Аналитика", self.create_analytics_tab)
+        self.symptoms_tab = self.add_lazy_tab("🩺 Симптомы", self.create_symptoms_tab)
+        self.emergency_tab = self.add_lazy_tab("🆘 Экстренная помощь", self.create_emergency_tab)
 
-        # Вкладка "История"
-        self.create_history_tab()
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
-        # Вкладка "Аналитика"
-        self.create_analytics_tab()
+        # Панель диагностики не видна в интерфейсе, открывается сочетанием клавиш
+        self.diagnostics_window = None
+        self.root.bind("<Control-D>", self.toggle_diagnostics)
+
+    def add_lazy_tab(self, text, builder):
+        tab = ttk.Frame(self.notebook)
+        self.notebook.add(tab, text=text)
+        self.tab_builders[str(tab)] = (tab, builder)
+        return tab
 
-        # Вкладка "Экстренная помощь" (улучшенная)
-        self.create_emergency_tab()
+    def on_tab_changed(self, event):
+        # Вкладка строится один раз, при первом выборе
+        selected = self.notebook.select()
+        if selected in self.tab_builders:
+            tab, builder = self.tab_builders.pop(selected)
+            with psihoz_perf.timed(f"tab.{builder.__name__}"):
+                builder(tab)
+        # Графики аналитики обновляются при каждом открытии вкладки:
+        # если данные не менялись, это одна проверка версии в фоновом потоке
+        if selected == str(self.analytics_tab) and self.analytics_ready:
+            self.update_analytics(notify=False)
 
     def create_new_entry_tab(self):
         tab = ttk.Frame(self.notebook)
@@ -185,8 +307,7 @@ class PsihozApp:
         mood_container.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
         self.mood_var = tk.StringVar()
-        moods = ["Отлично 😊", "Хорошо 🙂", "Нормально 😐", "Плохо 🙁", "Ужасно 😞"]
-        for mood in moods:
+        for mood in MOODS:
             rb = ttk.Radiobutton(mood_container, 
                                 text=mood, 
                                 variable=self.mood_var, 
@@ -223,6 +344,18 @@ class PsihozApp:
         self.text_note.config(yscrollcommand=scrollbar.set)
         scrollbar.config(command=self.text_note.yview)
 
+        # Тональность заметки: пересчитывается после паузы в наборе
+        meter_frame = ttk.Frame(note_frame)
+        meter_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(meter_frame, text="Тональность:").pack(side=tk.LEFT, padx=5)
+        self.sentiment_meter = ttk.Progressbar(meter_frame, orient=tk.HORIZONTAL,
+                                               length=200, maximum=200, mode='determinate')
+        self.sentiment_meter.pack(side=tk.LEFT, padx=5)
+        self.sentiment_meter_label = ttk.Label(meter_frame, text="—", font=self.small_font)
+        self.sentiment_meter_label.pack(side=tk.LEFT, padx=5)
+        self.live_sentiment_job = None
+        self.text_note.bind('<<Modified>>', self.on_note_modified)
+
         # Кнопка сохранения (теперь видимая и с правильными цветами)
         button_frame = ttk.Frame(form_card)
         button_frame.pack(fill=tk.X, pady=20)
@@ -240,14 +373,22 @@ class PsihozApp:
                               pady=5)
         save_button.pack(fill=tk.X, ipady=5)
 
-    def create_history_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="📜 История")
-
+    def create_history_tab(self, tab):
         # Основной контейнер
         container = ttk.Frame(tab)
         container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
 
+        # Поиск по заметкам и симптомам
+        search_frame = ttk.Frame(container)
+        search_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(search_frame, text="Поиск:").pack(side=tk.LEFT, padx=5)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_changed)
+        self.search_job = None
+        self.history_search = ""
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, font=self.text_font)
+        search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+
         # Таблица с записями
         columns = ("date", "mood", "symptoms", "note")
         self.history_tree = ttk.Treeview(container, 
@@ -269,11 +410,18 @@ class PsihozApp:
         
         self.history_tree.pack(fill=tk.BOTH, expand=True)
 
-        # Скроллбар
-        scrollbar = ttk.Scrollbar(container)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.history_tree.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.history_tree.yview)
+        # Скроллбар (при прокрутке подгружаются соседние страницы)
+        self.history_scrollbar = ttk.Scrollbar(container)
+        self.history_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.history_tree.config(yscrollcommand=self.on_history_scroll)
+        self.history_scrollbar.config(command=self.history_tree.yview)
+
+        # Состояние окна истории: ключи (ts, id) загруженных строк
+        self.history_keys = []
+        self.history_has_before = False
+        self.history_has_after = False
+        self.history_page_pending = False
+        self.history_load_span = None
 
         # Кнопка удаления (с правильными цветами)
         button_frame = ttk.Frame(container)
@@ -292,10 +440,29 @@ class PsihozApp:
                                 pady=5)
         delete_button.pack(fill=tk.X, ipady=5)
 
-    def create_analytics_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="📊 Аналитика")
+        # Резервные копии базы и синхронизация с другими устройствами
+        backup_frame = ttk.Frame(container)
+        backup_frame.pack(fill=tk.X)
+        for text, command in (("💾 Резервная копия", self.create_backup),
+                              ("♻️ Восстановить из копии", self.restore_backup),
+                              ("🔄 Синхронизация", self.sync_entries)):
+            tk.Button(backup_frame,
+                      text=text,
+                      command=command,
+                      bg=self.button_color,
+                      fg=self.text_dark,
+                      activebackground=self.accent_color,
+                      activeforeground=self.text_dark,
+                      font=self.text_font,
+                      relief='flat',
+                      padx=10,
+                      pady=5).pack(side=tk.LEFT, fill=tk.X, expand=True, ipady=5, padx=(0, 5))
+
+        # Первая страница истории загружается при открытии вкладки
+        self.history_ready = True
+        self.load_data()
 
+    def create_analytics_tab(self, tab):
         # Основной контейнер
         container = ttk.Frame(tab)
         container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -307,24 +474,41 @@ class PsihozApp:
         ttk.Label(mood_frame, 
                  text="Распределение настроения", 
                  font=self.subtitle_font).pack(anchor='w')
-        
-        self.figure_mood = plt.Figure(figsize=(6, 4), dpi=100)
-        self.ax_mood = self.figure_mood.add_subplot(111)
-        self.canvas_mood = FigureCanvasTkAgg(self.figure_mood, mood_frame)
-        self.canvas_mood.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.mood_frame = mood_frame
 
         # График симптомов
         symptoms_frame = ttk.Frame(container)
         symptoms_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        ttk.Label(symptoms_frame, 
+        symptoms_header = ttk.Frame(symptoms_frame)
+        symptoms_header.pack(fill=tk.X)
+        ttk.Label(symptoms_header, 
                  text="Динамика эмоционального состояния", 
-                 font=self.subtitle_font).pack(anchor='w')
+                 font=self.subtitle_font).pack(side=tk.LEFT)
         
-        self.figure_symptoms = plt.Figure(figsize=(6, 4), dpi=100)
-        self.ax_symptoms = self.figure_symptoms.add_subplot(111)
-        self.canvas_symptoms = FigureCanvasTkAgg(self.figure_symptoms, symptoms_frame)
-        self.canvas_symptoms.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # Диапазон графика (колесо мыши — масштаб, перетаскивание — сдвиг)
+        presets = [("Всё", 'all'), ("Год", 'year'), ("Месяц", 'month'), ("Неделя", 'week')]
+        for text, preset in presets:
+            tk.Button(symptoms_header,
+                      text=text,
+                      command=lambda p=preset: self.show_sentiment_preset(p),
+                      bg=self.button_color,
+                      fg=self.text_dark,
+                      activebackground=self.accent_color,
+                      activeforeground=self.text_dark,
+                      font=self.small_font,
+                      relief='flat',
+                      padx=8).pack(side=tk.RIGHT, padx=2)
+        self.symptoms_frame = symptoms_frame
+
+        # Скользящая статистика: окна 7/30/90 дней, серии, профили
+        stats_frame = ttk.Frame(container)
+        stats_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(stats_frame, 
+                 text="Статистика", 
+                 font=self.subtitle_font).pack(anchor='w')
+        self.stats_label = ttk.Label(stats_frame, text="", font=self.small_font, justify=tk.LEFT)
+        self.stats_label.pack(anchor='w', padx=5)
 
         # Кнопка обновления (с правильными цветами)
         button_frame = ttk.Frame(container)
@@ -343,10 +527,127 @@ class PsihozApp:
                                 pady=5)
         update_button.pack(fill=tk.X, ipady=5)
 
-    def create_emergency_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="🆘 Экстренная помощь")
+        rescore_button = tk.Button(button_frame, 
+                                 text="🧮 Пересчитать тональность", 
+                                 command=self.rescore_entries,
+                                 bg=self.button_color,
+                                 fg=self.text_dark,
+                                 activebackground=self.accent_color,
+                                 activeforeground=self.text_dark,
+                                 font=self.text_font,
+                                 relief='flat',
+                                 padx=10,
+                                 pady=5)
+        rescore_button.pack(fill=tk.X, ipady=5, pady=(10, 0))
+        self.build_analytics_charts()
+
+    def build_analytics_charts(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from psihoz_charts import MoodChart, RenderCache, SentimentChart
+
+        # Общий кэш готовых изображений обоих графиков
+        self.render_cache = RenderCache()
+        self.figure_mood = Figure(figsize=(6, 4), dpi=100, tight_layout=True)
+        self.canvas_mood = FigureCanvasTkAgg(self.figure_mood, self.mood_frame)
+        self.canvas_mood.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.mood_chart = MoodChart(self.figure_mood, self.canvas_mood, self.button_color,
+                                    self.render_cache)
+
+        self.figure_symptoms = Figure(figsize=(6, 4), dpi=100, tight_layout=True)
+        self.canvas_symptoms = FigureCanvasTkAgg(self.figure_symptoms, self.symptoms_frame)
+        self.canvas_symptoms.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.sentiment_chart = SentimentChart(self.figure_symptoms, self.canvas_symptoms, self.button_color,
+                                              self.render_cache)
+        self.analytics_ready = True
 
+    def create_symptoms_tab(self, tab):
+        # Основной контейнер
+        container = ttk.Frame(tab)
+        container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+
+        ttk.Label(container, 
+                 text="Симптомы и настроение", 
+                 font=self.subtitle_font).pack(anchor='w')
+        self.symptom_chart_frame = ttk.Frame(container)
+        self.symptom_chart_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+
+        button_frame = ttk.Frame(container)
+        button_frame.pack(fill=tk.X, pady=10)
+        
+        update_button = tk.Button(button_frame, 
+                                text="🔄 Обновить", 
+                                command=self.update_symptom_analytics,
+                                bg=self.button_color,
+                                fg=self.text_dark,
+                                activebackground=self.accent_color,
+                                activeforeground=self.text_dark,
+                                font=self.text_font,
+                                relief='flat',
+                                padx=10,
+                                pady=5)
+        update_button.pack(fill=tk.X, ipady=5)
+        self.build_symptom_charts()
+        self.update_symptom_analytics()
+
+    def build_symptom_charts(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.figure_symptom_stats = Figure(figsize=(8, 6), dpi=100, tight_layout=True)
+        grid = self.figure_symptom_stats.add_gridspec(2, 2)
+        self.ax_top_symptoms = self.figure_symptom_stats.add_subplot(grid[0, 0])
+        self.ax_symptom_moods = self.figure_symptom_stats.add_subplot(grid[0, 1])
+        self.ax_symptom_trend = self.figure_symptom_stats.add_subplot(grid[1, :])
+        self.canvas_symptom_stats = FigureCanvasTkAgg(self.figure_symptom_stats, self.symptom_chart_frame)
+        self.canvas_symptom_stats.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.symptoms_ready = True
+
+    def update_symptom_analytics(self):
+        from psihoz_analytics import load_symptom_analytics
+        self.worker.submit(load_symptom_analytics,
+                           channel="symptoms",
+                           callback=self.draw_symptom_analytics,
+                           error=self.on_worker_error)
+
+    def draw_symptom_analytics(self, data):
+        import matplotlib.dates as mdates
+        if not self.symptoms_ready:
+            return
+        for ax in (self.ax_top_symptoms, self.ax_symptom_moods, self.ax_symptom_trend):
+            ax.clear()
+        if data is None:
+            self.ax_top_symptoms.set_title('Нет записей с симптомами', fontsize=12)
+            self.canvas_symptom_stats.draw_idle()
+            return
+
+        # Самые частые симптомы
+        positions = range(len(data['top_names']))
+        self.ax_top_symptoms.barh(positions, data['top_counts'], color=self.button_color, edgecolor='black')
+        self.ax_top_symptoms.set_yticks(positions)
+        self.ax_top_symptoms.set_yticklabels(data['top_names'])
+        self.ax_top_symptoms.invert_yaxis()
+        self.ax_top_symptoms.set_title('Частые симптомы', fontsize=12, fontweight='bold')
+
+        # Симптом × настроение
+        self.ax_symptom_moods.imshow(data['matrix'], cmap='YlOrBr', aspect='auto')
+        self.ax_symptom_moods.set_xticks(range(len(data['moods'])))
+        self.ax_symptom_moods.set_xticklabels(data['moods'], rotation=45, ha='right')
+        self.ax_symptom_moods.set_yticks(positions)
+        self.ax_symptom_moods.set_yticklabels(data['top_names'])
+        self.ax_symptom_moods.set_title('Симптомы и настроение', fontsize=12, fontweight='bold')
+
+        # Частота по месяцам
+        for name, counts in zip(data['trend_names'], data['trend']):
+            self.ax_symptom_trend.plot(data['trend_months'], counts, label=name, linewidth=2)
+        locator = mdates.AutoDateLocator()
+        self.ax_symptom_trend.xaxis.set_major_locator(locator)
+        self.ax_symptom_trend.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        self.ax_symptom_trend.set_title('Частота симптомов по месяцам', fontsize=12, fontweight='bold')
+        self.ax_symptom_trend.legend(loc='upper left', fontsize=9)
+        self.canvas_symptom_stats.draw_idle()
+
+    def create_emergency_tab(self, tab):
         # Основной контейнер с прокруткой
         main_frame = ttk.Frame(tab)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -457,7 +758,7 @@ class PsihozApp:
             
             number_label = tk.Label(contact_frame, 
                     text=number, 
-                    font=Font(family="Arial", size=12, weight="bold"),
+                    font=self.font(size=12, weight="bold"),
                     bg=self.bg_color,
                     fg=self.button_color,
                     anchor='w')
@@ -502,7 +803,7 @@ class PsihozApp:
             
             url_label = tk.Label(resource_frame, 
                     text=url, 
-                    font=Font(family="Arial", size=11, underline=True),
+                    font=self.font(size=11, underline=True),
                     bg=self.bg_color,
                     fg="#1a0dab",
                     anchor='w',
@@ -520,23 +821,77 @@ class PsihozApp:
             messagebox.showerror("Ошибка", "Пожалуйста, выберите настроение")
             return
         
-        # Анализ настроения из текста
-        sentiment = self.sia.polarity_scores(note)
-        sentiment_score = sentiment['compound']
+        ts = parse_date(date)
+        if ts is None:
+            messagebox.showerror("Ошибка", "Дата должна быть в формате ГГГГ-ММ-ДД ЧЧ:ММ")
+            return
         
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO entries (date, mood, note, symptoms, sentiment_score)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (date, mood, note, symptoms, sentiment_score))
-            self.conn.commit()
-            
-            messagebox.showinfo("Успех", "Запись успешно сохранена")
+        # Анализ тональности и запись выполняются в фоновом потоке
+        span = psihoz_perf.start("save_entry")
+        self.worker.write(self.store_entry, date, ts, mood, note, symptoms,
+                          callback=lambda result: self.on_entry_saved(result, date, ts, mood, symptoms, note, span),
+                          error=lambda e: self.on_entry_save_error(e, span))
+
+    def store_entry(self, conn, date, ts, mood, note, symptoms):
+        # Выполняется в фоновом потоке: никаких обращений к виджетам.
+        # При первом сохранении здесь же загружается nltk.
+        from psihoz_sentiment import analyzer_version, note_hash, score_note
+        with psihoz_perf.timed("save_entry.score"):
+            sentiment_score = score_note(note)
+        with psihoz_perf.timed("save_entry.insert"):
+            return self.entry_cache.insert_entry(conn, date, ts, mood, note, symptoms, sentiment_score,
+                                                 note_hash(note), analyzer_version())
+
+    def on_entry_saved(self, entry_id, date, ts, mood, symptoms, note, span=None):
+        # Замер заканчивается до окна «Успех»: время ответа пользователя не учитывается
+        if span is not None:
+            span.finish()
+        messagebox.showinfo("Успех", "Запись успешно сохранена")
+        with psihoz_perf.timed("save_entry.ui"):
             self.clear_entry_fields()
-            self.load_data()
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось сохранить запись: {str(e)}")
+            self.history_insert_row(entry_id, ts, date, mood, symptoms, note)
+
+    def on_entry_save_error(self, e, span=None):
+        if span is not None:
+            span.finish()
+        messagebox.showerror("Ошибка", f"Не удалось сохранить запись: {str(e)}")
+
+    def on_note_modified(self, event=None):
+        # <<Modified>> приходит один раз до сброса флага; ловит и вставку мышью
+        if not self.text_note.edit_modified():
+            return
+        self.text_note.edit_modified(False)
+        if self.live_sentiment_job is not None:
+            self.root.after_cancel(self.live_sentiment_job)
+        self.live_sentiment_job = self.root.after(LIVE_SENTIMENT_DEBOUNCE_MS, self.run_live_sentiment)
+
+    def run_live_sentiment(self):
+        self.live_sentiment_job = None
+        text = self.text_note.get("1.0", tk.END)
+        if not text.strip():
+            # Пустая заметка: оценка не нужна, устаревший результат отбрасывается
+            self.worker.cancel("live_sentiment")
+            self.show_live_sentiment(None)
+            return
+        self.worker.spawn(self.live_score, text,
+                          channel="live_sentiment",
+                          callback=self.show_live_sentiment,
+                          error=lambda e: self.sentiment_meter_label.config(text="—"))
+
+    def live_score(self, text):
+        # Выполняется в отдельном потоке; абзацы оцениваются из кэша,
+        # заново — только изменённые
+        from psihoz_sentiment import score_live
+        with psihoz_perf.timed("live_sentiment.score"):
+            return score_live(text)
+
+    def show_live_sentiment(self, score):
+        if score is None:
+            self.sentiment_meter['value'] = 0
+            self.sentiment_meter_label.config(text="—")
+            return
+        self.sentiment_meter['value'] = (score + 1) * 100
+        self.sentiment_meter_label.config(text=f"{score:+.2f}")
 
     def clear_entry_fields(self):
         self.entry_date.delete(0, tk.END)
@@ -546,17 +901,168 @@ class PsihozApp:
         self.text_note.delete("1.0", tk.END)
 
     def load_data(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT date, mood, symptoms, note FROM entries ORDER BY date DESC")
-        rows = cursor.fetchall()
-        
-        # Очистка дерева
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        # Заполнение данными
+        # Сброс окна истории и загрузка первой страницы
+        self.history_load_span = psihoz_perf.start("load_data")
+        self.worker.cancel("search")
+        with psihoz_perf.timed("load_data.reset"):
+            self.history_tree.delete(*self.history_tree.get_children())
+        self.history_keys = []
+        self.history_has_before = False
+        self.history_has_after = True
+        self.load_history_page(True)
+
+    def load_history_page(self, forward):
+        if forward:
+            if not self.history_has_after:
+                self.history_page_pending = False
+                return
+            key = self.history_keys[-1] if self.history_keys else None
+        else:
+            if not self.history_has_before or not self.history_keys:
+                self.history_page_pending = False
+                return
+            key = self.history_keys[0]
+
+        # Новый запрос страницы отменяет предыдущий, ещё не выполненный
+        self.history_page_pending = True
+        self.worker.submit(self.entry_cache.history_page, key, forward,
+                           HISTORY_PAGE_SIZE, NOTE_PREVIEW_LEN,
+                           channel="history",
+                           callback=lambda rows: self.apply_history_page(rows, forward),
+                           error=self.on_worker_error)
+
+    def apply_history_page(self, rows, forward):
+        with psihoz_perf.timed("history_page.render") as span:
+            span.rows = len(rows)
+            self.render_history_page(rows, forward)
+        # Первая страница после load_data: полный путь запрос -> строки в таблице
+        if self.history_load_span is not None:
+            self.history_load_span.finish(rows=len(self.history_keys))
+            self.history_load_span = None
+
+    def render_history_page(self, rows, forward):
+        self.history_page_pending = False
+        if forward:
+            self.history_has_after = len(rows) == HISTORY_PAGE_SIZE
+        else:
+            self.history_has_before = len(rows) == HISTORY_PAGE_SIZE
+        # Строки, уже вставленные точечно (history_insert_row), не дублируем
+        rows = [row for row in rows if not self.history_tree.exists(str(row[0]))]
+        if not rows:
+            return
+
+        first, _ = self.history_tree.yview()
+        top_index = round(first * len(self.history_keys))
+
+        keys = [(row[1], row[0]) for row in rows]
+        if forward:
+            for row in rows:
+                self.history_tree.insert("", tk.END, iid=str(row[0]), values=row[2:])
+            self.history_keys.extend(keys)
+        else:
+            for index, row in enumerate(rows):
+                self.history_tree.insert("", index, iid=str(row[0]), values=row[2:])
+            self.history_keys[:0] = keys
+            top_index += len(rows)
+
+        # Вытесняем дальние страницы, чтобы в Tk держалось ограниченное окно
+        excess = len(self.history_keys) - HISTORY_PAGE_SIZE * HISTORY_MAX_PAGES
+        if excess > 0:
+            if forward:
+                dropped = self.history_keys[:excess]
+                del self.history_keys[:excess]
+                self.history_has_before = True
+                top_index -= excess
+            else:
+                dropped = self.history_keys[-excess:]
+                del self.history_keys[-excess:]
+                self.history_has_after = True
+            self.history_tree.delete(*[str(key[1]) for key in dropped])
+
+        # Сохраняем видимую позицию после вставки/вытеснения строк
+        if self.history_keys:
+            self.history_tree.yview_moveto(max(top_index, 0) / len(self.history_keys))
+
+    def history_position(self, key):
+        # Бинарный поиск позиции ключа в окне (ключи отсортированы по убыванию)
+        low, high = 0, len(self.history_keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self.history_keys[middle] > key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def history_insert_row(self, entry_id, ts, date, mood, symptoms, note):
+        # Вставляем только новую строку, если она попадает в загруженное окно
+        # (вкладка ещё не открыта — строки появятся при первой загрузке)
+        if not self.history_ready or self.history_search:
+            return
+        key = (ts, entry_id)
+        index = self.history_position(key)
+        if index == 0 and self.history_has_before:
+            return
+        if index == len(self.history_keys) and self.history_has_after:
+            return
+        self.history_tree.insert("", index, iid=str(entry_id),
+                                 values=(date, mood, symptoms, note[:NOTE_PREVIEW_LEN]))
+        self.history_keys.insert(index, key)
+
+    def history_remove_row(self, iid):
+        # Удаляем только одну строку и при необходимости догружаем соседние
+        if not self.history_tree.exists(iid):
+            return
+        index = self.history_tree.index(iid)
+        self.history_tree.delete(iid)
+        del self.history_keys[index]
+        if not self.history_keys and (self.history_has_after or self.history_has_before):
+            self.load_data()
+        else:
+            self.on_history_scroll(*self.history_tree.yview())
+
+    def on_search_changed(self, *args):
+        # Запрос уходит только после паузы в наборе
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        text = self.search_var.get().strip()
+        if not text:
+            if self.history_search:
+                self.history_search = ""
+                self.load_data()
+            return
+        self.history_search = text
+        self.worker.cancel("history")
+        self.history_page_pending = False
+        self.worker.submit(psihoz_db.search_entries, text, SEARCH_LIMIT, NOTE_PREVIEW_LEN,
+                           channel="search",
+                           callback=self.show_search_results,
+                           error=self.on_worker_error)
+
+    def show_search_results(self, rows):
+        # Результаты поиска по релевантности; подгрузка страниц отключена
+        if not self.history_search:
+            return
+        self.history_tree.delete(*self.history_tree.get_children())
+        self.history_keys = [(row[1], row[0]) for row in rows]
+        self.history_has_before = False
+        self.history_has_after = False
         for row in rows:
-            self.history_tree.insert("", tk.END, values=row)
+            self.history_tree.insert("", tk.END, iid=str(row[0]), values=row[2:])
+        self.history_tree.yview_moveto(0)
+
+    def on_history_scroll(self, first, last):
+        self.history_scrollbar.set(first, last)
+        if self.history_page_pending:
+            return
+        if float(last) >= 1 - HISTORY_PREFETCH and self.history_has_after:
+            self.load_history_page(True)
+        elif float(first) <= HISTORY_PREFETCH and self.history_has_before:
+            self.load_history_page(False)
 
     def delete_entry(self):
         selected_item = self.history_tree.selection()
@@ -564,49 +1070,282 @@ class PsihozApp:
             messagebox.showerror("Ошибка", "Пожалуйста, выберите запись для удаления")
             return
         
-        date = self.history_tree.item(selected_item)['values'][0]
+        iid = selected_item[0]
+        date = self.history_tree.item(iid)['values'][0]
         
         if messagebox.askyesno("Подтверждение", f"Удалить запись от {date}?"):
-            try:
-                cursor = self.conn.cursor()
-                cursor.execute("DELETE FROM entries WHERE date = ?", (date,))
-                self.conn.commit()
-                self.load_data()
-                messagebox.showinfo("Успех", "Запись удалена")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось удалить запись: {str(e)}")
+            span = psihoz_perf.start("delete_entry")
+            self.worker.write(self.entry_cache.delete_entry, int(iid),
+                              callback=lambda result: self.on_entry_deleted(iid, span),
+                              error=lambda e: self.on_entry_delete_error(e, span))
 
-    def update_analytics(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT date, mood, sentiment_score, symptoms FROM entries ORDER BY date")
-        data = cursor.fetchall()
-        
-        if not data:
-            messagebox.showinfo("Информация", "Нет данных для анализа")
+    def on_entry_deleted(self, iid, span=None):
+        with psihoz_perf.timed("delete_entry.ui"):
+            self.history_remove_row(iid)
+        if span is not None:
+            span.finish()
+        messagebox.showinfo("Успех", "Запись удалена")
+
+    def on_entry_delete_error(self, e, span=None):
+        if span is not None:
+            span.finish()
+        messagebox.showerror("Ошибка", f"Не удалось удалить запись: {str(e)}")
+
+    def update_analytics(self, notify=True):
+        # Данные готовятся в фоновом потоке; повторное нажатие отменяет прошлый запрос.
+        # Если версия данных не изменилась, поток возвращает только её.
+        from psihoz_analytics import load_analytics
+        span = psihoz_perf.start("update_analytics")
+        self.worker.submit(load_analytics, self.entry_cache, self.analytics_version,
+                           channel="analytics",
+                           callback=lambda data: self.draw_analytics(data, span, notify),
+                           error=lambda e: self.on_analytics_error(e, span))
+
+    def on_analytics_error(self, e, span=None):
+        if span is not None:
+            span.finish()
+        self.on_worker_error(e)
+
+    def draw_analytics(self, data, span=None, notify=True):
+        from psihoz_analytics import format_statistics
+        # Рисовать нечего: нет записей, вкладка ещё не открывалась (графики
+        # построятся при открытии) или данные не менялись (на графиках уже
+        # актуальная картинка)
+        if data is None or not self.analytics_ready or 'moods' not in data:
+            if span is not None:
+                span.finish(rows=0)
+            if data is None and notify:
+                messagebox.showinfo("Информация", "Нет данных для анализа")
             return
-        
-        # Подготовка данных
-        df = pd.DataFrame(data, columns=['date', 'mood', 'sentiment', 'symptoms'])
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # График настроения
-        self.ax_mood.clear()
-        mood_counts = df['mood'].value_counts()
-        mood_counts.plot(kind='bar', ax=self.ax_mood, color=self.button_color, edgecolor='black')
-        self.ax_mood.set_title('Распределение настроения', fontsize=14, fontweight='bold')
-        self.ax_mood.set_xlabel('Настроение', fontsize=12)
-        self.ax_mood.set_ylabel('Количество записей', fontsize=12)
-        self.figure_mood.tight_layout()
-        self.canvas_mood.draw()
-        
-        # График динамики настроения
-        self.ax_symptoms.clear()
-        df['sentiment'].plot(ax=self.ax_symptoms, color=self.button_color, linewidth=2)
-        self.ax_symptoms.set_title('Динамика эмоционального состояния', fontsize=14, fontweight='bold')
-        self.ax_symptoms.set_xlabel('Дата', fontsize=12)
-        self.ax_symptoms.set_ylabel('Оценка настроения (-1 до 1)', fontsize=12)
-        self.figure_symptoms.tight_layout()
-        self.canvas_symptoms.draw()
+
+        # Графики обновляют существующие объекты, а не строятся заново;
+        # уже виденные состояния берутся из кэша изображений
+        with psihoz_perf.timed("update_analytics.draw"):
+            self.mood_chart.update(data['moods'], data['mood_counts'], data['version'])
+            self.sentiment_chart.update(data['sentiment'], data['version'])
+            self.stats_label.config(text="\n".join(format_statistics(data['stats'])))
+        self.analytics_version = data['version']
+        if span is not None:
+            span.finish(rows=len(data['sentiment']['raw'][0]))
+
+    def show_sentiment_preset(self, preset):
+        if self.analytics_ready:
+            self.sentiment_chart.show_preset(preset)
+
+    def rescore_entries(self):
+        # Пакетный пересчёт в отдельном потоке; прогресс показывается в заголовке
+        if self.rescore_progress is not None:
+            return
+        from psihoz_rescore import rescore_entries
+        self.rescore_progress = (0, 0)
+
+        def start(result):
+            self.worker.spawn(rescore_entries, DB_PATH, self.on_rescore_progress,
+                              callback=self.on_rescore_done,
+                              error=self.on_rescore_error)
+
+        # Пересчёт идёт через своё соединение: сначала фиксируем отложенные записи
+        self.worker.flush(callback=start, error=self.on_rescore_error)
+
+    def on_rescore_progress(self, done, total):
+        # Вызывается из фонового потока: только запоминаем значение
+        self.rescore_progress = (done, total)
+
+    def on_rescore_done(self, count):
+        self.rescore_progress = None
+        messagebox.showinfo("Успех", f"Пересчитано записей: {count}")
+        if self.analytics_ready:
+            self.update_analytics()
+
+    def on_rescore_error(self, e):
+        self.rescore_progress = None
+        messagebox.showerror("Ошибка", f"Не удалось пересчитать тональность: {str(e)}")
+
+    def create_backup(self):
+        # Копия в отдельном потоке (online backup API), окно не блокируется
+        if self.backup_progress is not None:
+            return
+        from psihoz_backup import create_snapshot
+        self.backup_progress = (0, 0)
+
+        def start(result):
+            self.worker.spawn(create_snapshot, DB_PATH, None, self.on_backup_progress,
+                              callback=self.on_backup_done,
+                              error=self.on_backup_error)
+
+        # Копия делается своим соединением: сначала фиксируем отложенные записи
+        self.worker.flush(callback=start, error=self.on_backup_error)
+
+    def on_backup_progress(self, done, total):
+        # Вызывается из фонового потока: только запоминаем значение
+        self.backup_progress = (done, total)
+
+    def on_backup_done(self, path):
+        self.backup_progress = None
+        messagebox.showinfo("Успех", f"Резервная копия сохранена:\n{path}")
+
+    def on_backup_error(self, e):
+        self.backup_progress = None
+        messagebox.showerror("Ошибка", f"Не удалось создать резервную копию: {str(e)}")
+
+    def restore_backup(self):
+        from tkinter import filedialog
+        from psihoz_backup import default_directory
+        path = filedialog.askopenfilename(title="Восстановить из копии",
+                                          initialdir=default_directory(DB_PATH),
+                                          filetypes=[("База Psihoz", "*.db")])
+        if not path:
+            return
+        if not messagebox.askyesno("Подтверждение",
+                                   "Все текущие записи будут заменены записями из копии.\n"
+                                   "Текущая база сначала будет сохранена в резервную копию. Продолжить?"):
+            return
+        self.worker.submit(self.restore_from, path,
+                           callback=self.on_restore_done,
+                           error=lambda e: messagebox.showerror("Ошибка", f"Не удалось восстановить копию: {str(e)}"))
+
+    def restore_from(self, conn, path):
+        # Выполняется в потоке worker: очередь ждёт, пока база заменяется
+        from psihoz_backup import create_snapshot, restore_snapshot
+        from psihoz_sync import new_device
+        if conn.in_transaction:
+            conn.commit()
+        # Без ротации: она могла бы удалить выбранную копию
+        create_snapshot(DB_PATH, rotate=False)
+        count = restore_snapshot(conn, path)
+        # Копия помнит старые курсоры и часы синхронизации: под прежним номером
+        # устройства новые изменения совпали бы с уже отправленными
+        new_device(conn)
+        # data_version не меняется от записи своим соединением: кэш читается заново явно
+        self.entry_cache.load(conn)
+        return count
+
+    def on_restore_done(self, count):
+        self.reload_views()
+        messagebox.showinfo("Успех", f"Копия восстановлена, записей: {count}")
+
+    def reload_views(self):
+        # Записи заменены целиком (восстановление, синхронизация)
+        self.analytics_version = None
+        if self.history_ready:
+            self.search_var.set("")
+            self.history_search = ""
+            self.load_data()
+        if self.analytics_ready:
+            self.render_cache.clear()
+            self.update_analytics(notify=False)
+        if self.symptoms_ready:
+            self.update_symptom_analytics()
+
+    def sync_entries(self):
+        # Обмен изменениями с сервером (psihoz_sync) своим соединением в отдельном
+        # потоке; кэш записей увидит полученные записи по data_version
+        if self.sync_running:
+            return
+        from psihoz_sync import SYNC_URL, sync
+        self.sync_running = True
+
+        def start(result):
+            self.worker.spawn(sync, DB_PATH, SYNC_URL,
+                              callback=self.on_sync_done,
+                              error=self.on_sync_error)
+
+        # Отложенные записи фиксируются, чтобы попасть в эту же синхронизацию
+        self.worker.flush(callback=start, error=self.on_sync_error)
+
+    def on_sync_done(self, stats):
+        self.sync_running = False
+        if stats['applied']:
+            self.reload_views()
+        message = (f"Отправлено изменений: {stats['pushed']}\n"
+                   f"Получено изменений: {stats['pulled']}\n"
+                   f"Изменено записей: {stats['applied']}")
+        if stats['device_renewed']:
+            message += "\n\nНомер устройства совпадал с другой копией базы: назначен новый"
+        messagebox.showinfo("Синхронизация", message)
+
+    def on_sync_error(self, e):
+        self.sync_running = False
+        messagebox.showerror("Ошибка", f"Не удалось синхронизировать записи: {str(e)}")
+
+    def toggle_diagnostics(self, event=None):
+        if self.diagnostics_window is not None:
+            self.diagnostics_window.destroy()
+            self.diagnostics_window = None
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Диагностика")
+        window.geometry("720x420")
+        window.configure(bg=self.bg_color)
+        window.protocol("WM_DELETE_WINDOW", self.toggle_diagnostics)
+        self.diagnostics_window = window
+
+        columns = ("name", "count", "p50", "p95", "max", "rows")
+        tree = ttk.Treeview(window, columns=columns, show="headings", height=14)
+        for column, title, width in (("name", "Замер", 240), ("count", "Число", 70),
+                                     ("p50", "p50, мс", 90), ("p95", "p95, мс", 90),
+                                     ("max", "max, мс", 90), ("rows", "Строк", 80)):
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor='w' if column == "name" else 'e')
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.diagnostics_tree = tree
+
+        self.diagnostics_counts = tk.Label(window, text="", font=self.small_font,
+                                           bg=self.bg_color, fg=self.text_dark, anchor='w')
+        self.diagnostics_counts.pack(fill=tk.X, padx=10)
+
+        button_frame = ttk.Frame(window)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        tk.Button(button_frame,
+                  text="Сбросить",
+                  command=psihoz_perf.clear,
+                  bg=self.button_color,
+                  fg=self.text_dark,
+                  activebackground=self.accent_color,
+                  activeforeground=self.text_dark,
+                  font=self.small_font,
+                  relief='flat',
+                  padx=10).pack(side=tk.LEFT)
+        if psihoz_perf.PROFILE_DIR:
+            tk.Button(button_frame,
+                      text="Сохранить профиль",
+                      command=self.save_profiles,
+                      bg=self.button_color,
+                      fg=self.text_dark,
+                      activebackground=self.accent_color,
+                      activeforeground=self.text_dark,
+                      font=self.small_font,
+                      relief='flat',
+                      padx=10).pack(side=tk.LEFT, padx=10)
+
+        # Размеры таблиц читаются один раз при открытии, чтобы сама панель
+        # не заполняла буфер замеров
+        self.worker.submit(psihoz_db.fetch_table_counts,
+                           channel="diagnostics",
+                           callback=self.show_table_counts,
+                           error=self.on_worker_error)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        if self.diagnostics_window is None or not self.diagnostics_window.winfo_exists():
+            self.diagnostics_window = None
+            return
+        self.diagnostics_tree.delete(*self.diagnostics_tree.get_children())
+        for name, count, p50, p95, longest, rows in psihoz_perf.summary():
+            self.diagnostics_tree.insert("", tk.END, values=(
+                name, count, f"{p50:.1f}", f"{p95:.1f}", f"{longest:.1f}",
+                "" if rows is None else f"{rows:.0f}"))
+        self.diagnostics_window.after(DIAGNOSTICS_REFRESH_MS, self.refresh_diagnostics)
+
+    def show_table_counts(self, counts):
+        if self.diagnostics_window is not None:
+            self.diagnostics_counts.config(
+                text="Строк в таблицах: " + ", ".join(f"{table} {count}" for table, count in counts))
+
+    def save_profiles(self):
+        paths = psihoz_perf.dump_profiles()
+        messagebox.showinfo("Диагностика", f"Сохранено профилей: {len(paths)}\n{psihoz_perf.PROFILE_DIR}")
 
     def call_number(self, number):
         messagebox.showinfo("Звонок", f"Имитация звонка на номер {number}")
@@ -619,6 +1358,10 @@ class PsihozApp:
         self.root.mainloop()
 
 if __name__ == "__main__":
+    # С аргументами — консольный отчёт без окна (см. psihoz_cli.py)
+    if len(sys.argv) > 1:
+        from psihoz_cli import main
+        sys.exit(main())
     root = tk.Tk()
     app = PsihozApp(root)
     app.run()
\ No newline at end of file
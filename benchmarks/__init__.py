@@ -0,0 +1 @@
+# Бенчмарки и генератор синтетических данных: python -m benchmarks --help
@@ -0,0 +1,437 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import SIZES, SPAN_DAYS, ensure_database, generate_rows
+from psihoz_db import format_date
+
+# Бенчмарки Psihoz на синтетических дневниках разного размера.
+#
+# Уровень данных (всегда): запросы, которые выполняют методы приложения
+# в фоновом потоке. Уровень интерфейса (нужен дисплей): сами методы
+# PsihozApp — от вызова до отрисовки результата. Без $DISPLAY запускается
+# Xvfb, если он установлен; иначе эти бенчмарки помечаются пропущенными.
+#
+# python -m benchmarks --sizes 1k 100k --out results.json
+# python -m benchmarks --compare benchmarks/baseline.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DATA_DIR = os.path.join(tempfile.gettempdir(), "psihoz-bench")
+
+REPEAT = 5
+SCORE_SAMPLE = 200          # заметок на один замер score_note
+WRITE_SAMPLE = 20           # записей на один замер save/delete
+GUI_TIMEOUT = 60            # секунд на одну операцию интерфейса
+TOLERANCE = 0.2             # медиана выросла больше чем на 20% — регрессия
+XVFB_DISPLAY = ":99"
+
+GUI_BENCHMARKS = ("app.load_data", "app.load_data_during_backup", "app.save_entry",
+                  "app.delete_entry", "app.update_analytics", "app.update_analytics_unchanged",
+                  "app.cold_start")
+
+
+def summarize(timings):
+    ms = [t * 1000 for t in timings]
+    return {
+        "runs": len(ms),
+        "min_ms": round(min(ms), 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+    }
+
+
+def measure(func, repeat):
+    # Первый вызов не учитывается: импорт numpy/nltk, холодный кэш страниц
+    func()
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+class BackupLoop:
+    # Резервные копии одна за другой в отдельном потоке, пока идёт замер:
+    # with BackupLoop(db_path): ...
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.directory = tempfile.mkdtemp(prefix="psihoz-bench-backup-")
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.snapshots = 0
+
+    def run(self):
+        from psihoz_backup import BackupCancelled, create_snapshot
+        while not self.stopping.is_set():
+            try:
+                create_snapshot(self.db_path, self.directory, stop=self.stopping)
+                self.snapshots += 1
+            except BackupCancelled:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stopping.set()
+        self.thread.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return False
+
+
+def sample_entries(count, seed=2):
+    # Новые записи для save/delete: другой seed, даты после основного дневника
+    shift = (SPAN_DAYS + 1) * 86400
+    return [(format_date(ts + shift), ts + shift, mood, note, symptoms)
+            for date, ts, mood, note, symptoms in generate_rows(count, seed)]
+
+
+# Уровень данных
+
+def bench_data(db_path, repeat):
+    import psihoz_db
+    from psihoz_analytics import load_analytics
+    from psihoz_cache import EntryCache
+    from psihoz_sentiment import analyzer_version, note_hash, score_note
+    from PSIHOZ import HISTORY_PAGE_SIZE, NOTE_PREVIEW_LEN
+
+    results = {}
+    conn = sqlite3.connect(db_path)
+
+    results["db.fetch_history_page"] = measure(
+        lambda: psihoz_db.fetch_history_page(conn, None, True, HISTORY_PAGE_SIZE, NOTE_PREVIEW_LEN),
+        repeat)
+    # Приложение читает историю и аналитику из прогретого кэша столбцов
+    results["cache.load"] = measure(lambda: EntryCache(NOTE_PREVIEW_LEN).refresh(conn), repeat)
+    cache = EntryCache(NOTE_PREVIEW_LEN)
+    cache.refresh(conn)
+    results["cache.history_page"] = measure(
+        lambda: cache.history_page(conn, None, True, HISTORY_PAGE_SIZE, NOTE_PREVIEW_LEN), repeat)
+    results["db.load_analytics"] = measure(lambda: load_analytics(conn, cache), repeat)
+
+    notes = [row[3] for row in sample_entries(SCORE_SAMPLE)]
+    score_note("прогрев")
+    results["sentiment.score_note"] = [t / len(notes) for t in
+                                       measure(lambda: [score_note(note) for note in notes], repeat)]
+
+    # Как store_entry: оценка + вставка; затем удаление тех же записей.
+    # Каждая операция со своим commit — худший случай без группового commit
+    rows = sample_entries(WRITE_SAMPLE)
+    version = analyzer_version()
+    inserted, insert_times, delete_times = [], [], []
+    for i in range(repeat):
+        for date, ts, mood, note, symptoms in rows:
+            started = time.perf_counter()
+            inserted.append(psihoz_db.insert_entry(conn, date, ts, mood, note, symptoms,
+                                                   score_note(note), note_hash(note), version))
+            conn.commit()
+            insert_times.append(time.perf_counter() - started)
+        while inserted:
+            entry_id = inserted.pop()
+            started = time.perf_counter()
+            psihoz_db.delete_entry(conn, entry_id)
+            conn.commit()
+            delete_times.append(time.perf_counter() - started)
+    results["db.insert_entry"] = insert_times
+    results["db.delete_entry"] = delete_times
+
+    # Резервная копия не должна добавлять задержку приложению: те же чтение
+    # и запись (вставка + commit + удаление + commit) без копии и во время копии
+    from psihoz_backup import create_snapshot
+    backup_dir = tempfile.mkdtemp(prefix="psihoz-bench-backup-")
+    results["backup.snapshot"] = measure(lambda: create_snapshot(db_path, backup_dir), repeat)
+    shutil.rmtree(backup_dir, ignore_errors=True)
+    date, ts, mood, note, symptoms = rows[0]
+
+    def write():
+        entry_id = psihoz_db.insert_entry(conn, date, ts, mood, note, symptoms, 0.0)
+        conn.commit()
+        psihoz_db.delete_entry(conn, entry_id)
+        conn.commit()
+
+    def fetch():
+        psihoz_db.fetch_history_page(conn, None, True, HISTORY_PAGE_SIZE, NOTE_PREVIEW_LEN)
+
+    write_sample = repeat * WRITE_SAMPLE
+    results["db.write"] = measure(write, write_sample)
+    with BackupLoop(db_path):
+        results["db.fetch_history_page_during_backup"] = measure(fetch, repeat)
+        results["db.write_during_backup"] = measure(write, write_sample)
+
+    # Синхронизация после первой (вся база, не замеряется): WRITE_SAMPLE своих
+    # записей уходит на сервер и столько же чужих приходит — время зависит
+    # от числа изменений, а не от размера дневника
+    from psihoz_sync import ENTRY_FIELDS, make_server, request, sync
+    sync_dir = tempfile.mkdtemp(prefix="psihoz-bench-sync-")
+    server = make_server(os.path.join(sync_dir, "server.db"), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    peer_clock = iter(range(1, 10 ** 9))
+
+    def sync_delta():
+        for date, ts, mood, note, symptoms in rows:
+            psihoz_db.insert_entry(conn, date, ts, mood, note, symptoms, 0.0)
+        conn.commit()
+        changes = [{"uid": psihoz_db.new_uid(), "op": "insert", "clock": next(peer_clock),
+                    "entry": dict(zip(ENTRY_FIELDS, (date, ts, mood, note, symptoms, 0.0, None, None)))}
+                   for date, ts, mood, note, symptoms in rows]
+        request(url, "/push", {"device": "bench-peer"}, {"changes": changes})
+        sync(db_path, url)
+
+    try:
+        sync(db_path, url)
+        results["sync.delta"] = measure(sync_delta, repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(sync_dir, ignore_errors=True)
+    conn.close()
+
+    child = ("import sqlite3, psihoz_db, PSIHOZ; c = sqlite3.connect(%r); psihoz_db.migrate(c); "
+             "psihoz_db.fetch_history_page(c, None, True, PSIHOZ.HISTORY_PAGE_SIZE, "
+             "PSIHOZ.NOTE_PREVIEW_LEN)" % db_path)
+    results["db.cold_start"] = measure(
+        lambda: subprocess.run([sys.executable, "-c", child], cwd=ROOT, check=True), repeat)
+    return results
+
+
+# Уровень интерфейса
+
+def ensure_display():
+    # Возвращает (процесс Xvfb или None, причина пропуска или None)
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return None, None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None, "нет дисплея и Xvfb"
+    process = subprocess.Popen([xvfb, XVFB_DISPLAY, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    socket = "/tmp/.X11-unix/X" + XVFB_DISPLAY.lstrip(":")
+    for i in range(50):
+        if os.path.exists(socket):
+            os.environ["DISPLAY"] = XVFB_DISPLAY
+            return process, None
+        time.sleep(0.1)
+    process.terminate()
+    return None, "Xvfb не запустился"
+
+
+def wait_idle(app):
+    # Прокачивает цикл Tk, пока фоновый поток не отдаст все результаты
+    deadline = time.perf_counter() + GUI_TIMEOUT
+    while app.worker.busy() or getattr(app, "history_page_pending", False):
+        if time.perf_counter() > deadline:
+            raise TimeoutError("операция интерфейса не завершилась")
+        app.worker.poll()
+        app.root.update()
+        time.sleep(0.001)
+    app.root.update()
+
+
+def bench_gui(db_path, repeat):
+    import tkinter as tk
+    import PSIHOZ
+
+    # Диалоги подтверждения и «Успех» блокировали бы замер
+    PSIHOZ.messagebox.showinfo = lambda *args, **kwargs: None
+    PSIHOZ.messagebox.askyesno = lambda *args, **kwargs: True
+
+    def fail(title, message, **kwargs):
+        raise RuntimeError(message)
+
+    PSIHOZ.messagebox.showerror = fail
+
+    results = {}
+    PSIHOZ.DB_PATH = db_path
+    root = tk.Tk()
+    app = PSIHOZ.PsihozApp(root)
+    # Копия по расписанию не должна попасть в замеры; под нагрузкой копии
+    # измеряется отдельно (app.load_data_during_backup)
+    app.backup_service.stop()
+    try:
+        # Вкладки строятся при первом выборе
+        for tab in (app.analytics_tab, app.history_tab):
+            app.notebook.select(tab)
+            wait_idle(app)
+
+        def load_data():
+            app.load_data()
+            wait_idle(app)
+
+        results["app.load_data"] = measure(load_data, repeat)
+        with BackupLoop(db_path):
+            results["app.load_data_during_backup"] = measure(load_data, repeat)
+
+        def update_analytics():
+            # Полный пересчёт и отрисовка: версия и кэш изображений сброшены
+            app.analytics_version = None
+            app.render_cache.clear()
+            app.update_analytics()
+            wait_idle(app)
+
+        results["app.update_analytics"] = measure(update_analytics, repeat)
+
+        def update_analytics_unchanged():
+            app.update_analytics()
+            wait_idle(app)
+
+        results["app.update_analytics_unchanged"] = measure(update_analytics_unchanged, repeat)
+
+        rows = sample_entries(WRITE_SAMPLE)
+        save_times, delete_times = [], []
+        for i in range(repeat):
+            for date, ts, mood, note, symptoms in rows:
+                app.entry_date.delete(0, tk.END)
+                app.entry_date.insert(0, date)
+                app.mood_var.set(mood)
+                app.entry_symptoms.insert(0, symptoms)
+                app.text_note.insert("1.0", note)
+                started = time.perf_counter()
+                app.save_entry()
+                wait_idle(app)
+                save_times.append(time.perf_counter() - started)
+            # Новые записи позже основного дневника — они в начале таблицы
+            for j in range(len(rows)):
+                children = app.history_tree.get_children()
+                app.history_tree.selection_set(children[0])
+                started = time.perf_counter()
+                app.delete_entry()
+                wait_idle(app)
+                delete_times.append(time.perf_counter() - started)
+        results["app.save_entry"] = save_times
+        results["app.delete_entry"] = delete_times
+    finally:
+        app.on_close()
+
+    # От запуска процесса до первого кадра окна; фоновые задачи не ждём
+    child = ("import os, tkinter, PSIHOZ; PSIHOZ.DB_PATH = %r; root = tkinter.Tk(); "
+             "app = PSIHOZ.PsihozApp(root); root.update(); os._exit(0)" % db_path)
+    results["app.cold_start"] = measure(
+        lambda: subprocess.run([sys.executable, "-c", child], cwd=ROOT, check=True), repeat)
+    return results
+
+
+def run(sizes, repeat, data_dir, gui=True):
+    report = {"meta": metadata(), "results": {}}
+    xvfb, skip_reason = ensure_display() if gui else (None, "отключено (--no-gui)")
+    try:
+        for size in sizes:
+            print(f"[{size}] подготовка данных...", file=sys.stderr)
+            source = ensure_database(data_dir, SIZES[size])
+            # Бенчмарки записи работают с копией, сгенерированная база не меняется
+            work_dir = tempfile.mkdtemp(prefix="psihoz-bench-")
+            db_path = os.path.join(work_dir, "psihoz.db")
+            shutil.copyfile(source, db_path)
+            try:
+                results = {}
+                print(f"[{size}] уровень данных...", file=sys.stderr)
+                for name, timings in bench_data(db_path, repeat).items():
+                    results[name] = summarize(timings)
+                if skip_reason is None:
+                    print(f"[{size}] интерфейс...", file=sys.stderr)
+                    for name, timings in bench_gui(db_path, repeat).items():
+                        results[name] = summarize(timings)
+                else:
+                    for name in GUI_BENCHMARKS:
+                        results[name] = {"skipped": skip_reason}
+                report["results"][size] = results
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+    return report
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    # Сравнение медиан; возвращает список регрессий
+    lines, regressions = [], []
+    for size, results in report["results"].items():
+        for name, result in results.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base or "median_ms" not in base or "median_ms" not in result:
+                continue
+            ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+            mark = ""
+            if ratio > 1 + tolerance:
+                mark = "  РЕГРЕССИЯ"
+                regressions.append((size, name, ratio))
+            lines.append(f"{size:>5} {name:<24} {base['median_ms']:>10.3f} -> "
+                         f"{result['median_ms']:>10.3f} мс  x{ratio:.2f}{mark}")
+    print("\n".join(lines))
+    return regressions
+
+
+def print_report(report):
+    for size, results in report["results"].items():
+        for name, result in results.items():
+            if "skipped" in result:
+                print(f"{size:>5} {name:<24} пропущено: {result['skipped']}")
+            else:
+                print(f"{size:>5} {name:<24} медиана {result['median_ms']:>10.3f} мс, "
+                      f"мин {result['min_ms']:>10.3f} мс ({result['runs']} замеров)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки Psihoz")
+    parser.add_argument("--sizes", nargs="+", choices=tuple(SIZES), default=["1k", "100k"])
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="кэш сгенерированных баз")
+    parser.add_argument("--out", help="сохранить результаты в JSON")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"сохранить результаты как {os.path.relpath(BASELINE_PATH, ROOT)}")
+    parser.add_argument("--compare", metavar="JSON", help="сравнить с сохранёнными результатами")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--no-gui", action="store_true", help="только уровень данных")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat, args.data_dir, gui=not args.no_gui)
+    print_report(report)
+
+    skipped = sorted({name for results in report["results"].values()
+                      for name, result in results.items() if "skipped" in result})
+    if args.save_baseline and skipped:
+        # Базовые результаты без замеров интерфейса не ловят регрессии в нём
+        print(f"Базовые результаты не сохранены, пропущено: {', '.join(skipped)}", file=sys.stderr)
+        args.save_baseline = False
+
+    for path in filter(None, (args.out, BASELINE_PATH if args.save_baseline else None)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nСравнение с {args.compare} (коммит {baseline['meta'].get('commit')}):")
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
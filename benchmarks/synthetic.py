@@ -0,0 +1,125 @@
+import os
+import random
+import sqlite3
+
+from psihoz_db import MOODS, SCHEMA_VERSION, format_date, migrate
+from psihoz_io import IMPORT_BATCH, insert_batch, submit_scores
+from psihoz_rescore import process_pool
+
+# Детерминированный генератор дневника для бенчмарков.
+# Настроение меняется медленно (случайное блуждание), от него зависят
+# тон заметок и набор симптомов. Заметки на русском и английском,
+# часть пустые. Один и тот же seed всегда даёт одни и те же записи.
+
+SIZES = {
+    "1k": 1000,
+    "100k": 100000,
+    "1m": 1000000,
+}
+
+START_TS = 1420070400           # 2015-01-01
+SPAN_DAYS = 3650                # все записи укладываются в 10 лет
+ENGLISH_SHARE = 0.3
+EMPTY_NOTE_SHARE = 0.05
+
+SYMPTOMS = [
+    "тревога", "бессонница", "головная боль", "усталость", "раздражительность",
+    "апатия", "панические атаки", "плохой аппетит", "переедание", "рассеянность",
+    "слабость", "плаксивость", "навязчивые мысли", "боль в груди", "головокружение",
+    "одиночество", "чувство вины", "напряжение в теле",
+]
+
+# Предложения по тону: 0 — хорошо, 1 — нейтрально, 2 — плохо
+NOTES_RU = [
+    ["Сегодня был отличный день.", "Погуляла в парке, настроение хорошее.",
+     "Выспалась и чувствую себя бодро.", "Встретилась с друзьями, много смеялись.",
+     "Закончила проект, очень довольна собой.", "Утром сделала зарядку, стало легче.",
+     "Приятный вечер с семьёй.", "Получила хорошие новости."],
+    ["Обычный рабочий день.", "Ничего особенного не произошло.",
+     "Весь день занималась делами по дому.", "Много читала.",
+     "Съездила в магазин и приготовила ужин.", "Смотрела сериал вечером."],
+    ["Плохо спала ночью.", "С утра тревожно, не могу сосредоточиться.",
+     "Поссорилась с близким человеком.", "Весь день болит голова.",
+     "Чувствую себя одиноко.", "Ничего не хочется делать.",
+     "На работе снова стресс.", "Плакала вечером."],
+]
+NOTES_EN = [
+    ["Had a great day today.", "Went for a long walk and felt happy.",
+     "Slept well and feel energetic.", "Lovely dinner with friends, lots of laughs.",
+     "Finished my project and I am proud of it.", "Morning exercise really helped."],
+    ["Regular working day.", "Nothing special happened.", "Did some chores around the house.",
+     "Read a book in the evening.", "Cooked dinner and watched a movie."],
+    ["Slept badly again.", "Anxious all morning, could not focus.",
+     "Had a terrible argument.", "My head hurts all day.",
+     "I feel lonely and sad.", "Work was stressful and exhausting.", "Cried in the evening."],
+]
+
+
+def tone_of(mood_index):
+    # Отлично/Хорошо -> 0, Нормально -> 1, Плохо/Ужасно -> 2
+    return 0 if mood_index < 2 else 1 if mood_index == 2 else 2
+
+
+def generate_rows(count, seed=1):
+    # (date, ts, mood, note, symptoms) по возрастанию времени
+    rng = random.Random(seed)
+    step = SPAN_DAYS * 86400 / count
+    state = 2.0
+    for i in range(count):
+        ts = START_TS + int(i * step + rng.random() * step)
+        ts -= ts % 60
+        state = min(max(state + rng.gauss(0, 0.35), 0), len(MOODS) - 1)
+        mood_index = min(max(round(state + rng.gauss(0, 0.5)), 0), len(MOODS) - 1)
+        tone = tone_of(mood_index)
+
+        if rng.random() < EMPTY_NOTE_SHARE:
+            note = ""
+        else:
+            pool = NOTES_EN if rng.random() < ENGLISH_SHARE else NOTES_RU
+            sentences = []
+            for n in range(rng.randint(1, 4)):
+                # В основном тон настроения, иногда нейтральные предложения
+                sentences.append(rng.choice(pool[tone if rng.random() < 0.8 else 1]))
+            note = " ".join(sentences)
+
+        # Чем хуже настроение, тем больше симптомов
+        symptom_count = min(rng.randint(0, 1 + mood_index), 4)
+        symptoms = ", ".join(rng.sample(SYMPTOMS, symptom_count))
+
+        yield format_date(ts), ts, MOODS[mood_index], note, symptoms
+
+
+def database_path(data_dir, count, seed=1):
+    # Версия схемы в имени: после новой миграции база генерируется заново
+    return os.path.join(data_dir, f"psihoz_{count}_s{seed}_v{SCHEMA_VERSION}.db")
+
+
+def build_database(path, count, seed=1, workers=None):
+    # Запись через тот же путь, что и импорт (psihoz_io): триггеры агрегатов,
+    # FTS и справочник симптомов заполняются как в приложении
+    temp = path + ".tmp"
+    if os.path.exists(temp):
+        os.remove(temp)
+    conn = sqlite3.connect(temp)
+    migrate(conn)
+    with process_pool(workers) as pool:
+        batch = []
+        for row in generate_rows(count, seed):
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH:
+                insert_batch(conn, *submit_scores(pool, batch))
+                batch = []
+        if batch:
+            insert_batch(conn, *submit_scores(pool, batch))
+    conn.execute("ANALYZE")
+    conn.close()
+    os.replace(temp, path)
+    return path
+
+
+def ensure_database(data_dir, count, seed=1):
+    path = database_path(data_dir, count, seed)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        build_database(path, count, seed)
+    return path
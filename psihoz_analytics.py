@@ -0,0 +1,184 @@
+from psihoz_db import (MOODS, fetch_data_version, fetch_mood_totals,
+                       fetch_sentiment_mean_since, fetch_summary, fetch_symptom_links,
+                       fetch_top_symptoms, format_date)
+
+# Подготовка данных для графиков аналитики (без Tk и matplotlib).
+# Распределение настроения и ряды тональности считаются по столбцам
+# общего кэша записей (psihoz_cache): повторное обновление не читает базу.
+# Сводка для отчётов берётся из агрегатов (daily_mood, daily_sentiment).
+# numpy импортируется при первом вызове, в фоновом потоке.
+
+# Разрешения ряда тональности от самого грубого к самому подробному
+RESOLUTIONS = ('month', 'week', 'day', 'raw')
+
+TOP_SYMPTOMS = 10           # симптомов в рейтинге и в матрице
+TREND_SYMPTOMS = 5          # симптомов на графике частоты по месяцам
+RECENT_DAYS = 30            # «последние дни» в сводке
+PROFILE_MIN_SCORED = 5      # оценок, чтобы день недели или час попал в профиль
+WEEKDAYS = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
+
+def resample(keys, totals, counts):
+    # Среднее по корзинам с весом = число записей в дне
+    import numpy as np
+    buckets, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=totals)
+    sizes = np.bincount(inverse, weights=counts)
+    return buckets, sums / sizes
+
+
+def sentiment_series(ts, sentiment):
+    # Ряды в днях от 1970-01-01 (это и есть даты matplotlib):
+    # raw — отдельные записи, day/week/month — средние по периодам.
+    # ts отсортированы; записи без оценки (NaN) и с нераспознанной датой
+    # (ts <= 0) пропускаются.
+    import numpy as np
+    scored = ~np.isnan(sentiment) & (ts > 0)
+    ts = ts[scored]
+    scores = sentiment[scored].astype(np.float64)
+    days, inverse = np.unique(ts // 86400, return_inverse=True)
+    totals = np.bincount(inverse, weights=scores, minlength=len(days))
+    counts = np.bincount(inverse, minlength=len(days)).astype(np.float64)
+
+    # 1970-01-01 — четверг: сдвиг на 3 дня начинает неделю с понедельника
+    weeks, weekly = resample((days + 3) // 7, totals, counts)
+    months, monthly = resample(days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64),
+                               totals, counts)
+    month_starts = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    return {
+        'raw': (ts / 86400, scores),
+        'day': (days + 0.5, totals / counts),
+        'week': (weeks * 7 - 3 + 3.5, weekly),
+        'month': (month_starts + 15.0, monthly),
+    }
+
+
+def load_analytics(conn, cache=None, since=None):
+    # Без кэша (консольный отчёт) столбцы читаются один раз во временный.
+    # version — версия данных базы: если она равна since (уже нарисованные
+    # данные), возвращается только версия, без расчётов.
+    version = fetch_data_version(conn)
+    if since is not None and version == since:
+        return {'version': version}
+    from psihoz_cache import EntryCache
+    cache = cache or EntryCache()
+    if not cache.refresh(conn):
+        return None
+
+    import numpy as np
+    counts = np.bincount(cache.moods, minlength=len(cache.mood_names))[:len(cache.mood_names)]
+    order = [code for code in np.argsort(-counts, kind='stable') if counts[code]]
+    return {
+        'version': version,
+        'moods': [cache.mood_names[code] for code in order],
+        'mood_counts': counts[order].astype(np.int64),
+        'sentiment': sentiment_series(cache.ts, cache.sentiment),
+        'stats': cache.statistics().snapshot(),
+    }
+
+
+def load_statistics(conn, cache=None):
+    # Скользящая статистика (psihoz_stats) для отчётов
+    from psihoz_cache import EntryCache
+    cache = cache or EntryCache()
+    cache.refresh(conn)
+    return cache.statistics().snapshot()
+
+
+def extremes(rows, labels):
+    # Лучшая и худшая по тональности строки профиля с достаточным числом оценок
+    rated = [(mean, label) for (entries, scored, mean, bad), label in zip(rows, labels)
+             if mean is not None and scored >= PROFILE_MIN_SCORED]
+    if len(rated) < 2:
+        return None
+    return max(rated), min(rated)
+
+
+def format_statistics(stats):
+    # Строки для вкладки «Аналитика» и консольного отчёта
+    lines = []
+    for days, count, mean, std in stats['windows']:
+        if count:
+            lines.append(f"Тональность за {days} дн.: {mean:+.3f} ± {std:.3f} (оценок: {count})")
+    lines.append(f"Серия плохих дней: сейчас {stats['streak_current']}, "
+                 f"самая длинная {stats['streak_longest']}")
+    for title, rows, labels in (
+            ("День недели", stats['weekdays'], WEEKDAYS),
+            ("Час", stats['hours'], [f"{hour:02d}:00" for hour in range(24)])):
+        found = extremes(rows, labels)
+        if found:
+            (best, best_label), (worst, worst_label) = found
+            lines.append(f"{title}: лучший {best_label} ({best:+.2f}), худший {worst_label} ({worst:+.2f})")
+    return lines
+
+
+def load_summary(conn):
+    # Сводка по дневнику для отчётов: только агрегаты SQL, без numpy
+    count, first_ts, last_ts, mean, scored = fetch_summary(conn)
+    moods = fetch_mood_totals(conn)
+    recent = None
+    if last_ts:
+        # Последние RECENT_DAYS дней до последней записи, по дневным агрегатам
+        recent = fetch_sentiment_mean_since(conn, last_ts // 86400 - RECENT_DAYS + 1)
+    return {
+        'entries': count,
+        'first_date': format_date(first_ts) if first_ts else None,
+        'last_date': format_date(last_ts) if last_ts else None,
+        'moods': [(mood, total, total / count if count else 0.0) for mood, total in moods],
+        'sentiment_mean': mean,
+        'sentiment_recent': recent,
+        'scored': scored,
+        'top_symptoms': fetch_top_symptoms(conn, TOP_SYMPTOMS),
+    }
+
+
+def load_symptom_analytics(conn):
+    # Топ симптомов, частота по месяцам и матрица «симптом × настроение».
+    # Все подсчёты — np.bincount по целочисленным кодам.
+    names, links = fetch_symptom_links(conn)
+    if not links:
+        return None
+
+    import numpy as np
+    symptom_ids = np.fromiter((link[0] for link in links), dtype=np.int64, count=len(links))
+    days = np.fromiter((link[1] for link in links), dtype=np.int64, count=len(links))
+    link_moods = np.array([link[2] for link in links], dtype=object)
+
+    # Коды симптомов 0..n-1 и их частоты
+    symptom_keys, symptom_codes = np.unique(symptom_ids, return_inverse=True)
+    totals = np.bincount(symptom_codes)
+    top = np.argsort(-totals, kind='stable')[:TOP_SYMPTOMS]
+
+    # Настроения: сначала пять стандартных, затем встреченные в старых записях
+    mood_values, mood_inverse = np.unique(link_moods, return_inverse=True)
+    mood_keys = ([mood for mood in MOODS if mood in mood_values]
+                 + sorted(set(mood_values) - set(MOODS)))
+    mood_codes = np.array([mood_keys.index(mood) for mood in mood_values])[mood_inverse]
+    matrix = np.bincount(symptom_codes * len(mood_keys) + mood_codes,
+                         minlength=len(symptom_keys) * len(mood_keys))
+    matrix = matrix.reshape(len(symptom_keys), len(mood_keys))[top]
+
+    # Частота по месяцам для самых частых симптомов
+    # (записи с нераспознанной датой, ts = 0, в тренд не попадают)
+    dated = days > 0
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    first_month = months[dated].min() if dated.any() else 0
+    month_count = months[dated].max() - first_month + 1 if dated.any() else 0
+    trend_top = top[:TREND_SYMPTOMS]
+    selected = np.isin(symptom_codes, trend_top) & dated
+    rank = np.full(len(symptom_keys), -1)
+    rank[trend_top] = np.arange(len(trend_top))
+    trend = np.bincount(rank[symptom_codes[selected]] * month_count + (months[selected] - first_month),
+                        minlength=len(trend_top) * month_count).reshape(len(trend_top), month_count)
+    month_days = (np.arange(first_month, first_month + month_count)
+                  .astype('datetime64[M]').astype('datetime64[D]').astype(np.int64))
+
+    return {
+        'top_names': [names[symptom_keys[code]] for code in top],
+        'top_counts': totals[top],
+        'moods': mood_keys,
+        'matrix': matrix,
+        'trend_names': [names[symptom_keys[code]] for code in trend_top],
+        'trend_months': month_days,
+        'trend': trend,
+    }
@@ -0,0 +1,279 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import psihoz_perf
+from psihoz_db import configure_connection, migrate, renew_database_id
+
+# Резервные копии базы через online backup API SQLite.
+# Копия делается своим соединением, страницами по BACKUP_PAGES с паузой
+# между шагами: запись приложения не ждёт копию, GIL на время шага отпущен.
+# Всё копирование идёт внутри одной читающей транзакции — в режиме WAL
+# она фиксирует снимок базы, поэтому commit приложения во время копии
+# не перезапускает её с начала. Готовая копия проверяется PRAGMA
+# integrity_check и только после этого получает своё имя; лишние копии
+# удаляются по правилам RETENTION.
+#
+# python psihoz_backup.py create --db psihoz.db
+# python psihoz_backup.py restore backups/psihoz-20240101-120000.db --db psihoz.db
+
+BACKUP_DIR_NAME = "backups"         # рядом с файлом базы
+BACKUP_PAGES = 64                   # страниц за шаг (256 КБ при странице 4 КБ)
+BACKUP_PAUSE_S = 0.002              # пауза между шагами
+BACKUP_INTERVAL_S = 24 * 3600       # автоматическая копия раз в сутки
+BACKUP_DELAY_S = 30                 # первая проверка после запуска приложения
+BACKUP_CHECK_S = 600                # как часто сервис проверяет, не пора ли
+
+SNAPSHOT_PREFIX = "psihoz-"
+SNAPSHOT_FORMAT = "%Y%m%d-%H%M%S"
+
+# Хранение: несколько последних копий и самая новая копия за каждый
+# из последних дней, недель и месяцев; остальные удаляются
+RETENTION = (
+    ('last', 3),
+    ('day', 7),
+    ('week', 4),
+    ('month', 12),
+)
+
+_lock = threading.Lock()            # копии (ручная и по расписанию) — по одной
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+def default_directory(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR_NAME)
+
+
+def list_snapshots(directory):
+    # [(время, путь)] от новых к старым; посторонние файлы пропускаются
+    snapshots = []
+    if not os.path.isdir(directory):
+        return snapshots
+    for name in os.listdir(directory):
+        if not (name.startswith(SNAPSHOT_PREFIX) and name.endswith(".db")):
+            continue
+        stamp, _, repeat = name[len(SNAPSHOT_PREFIX):-3].partition("_")
+        if repeat and not repeat.isdigit():
+            continue
+        try:
+            moment = datetime.datetime.strptime(stamp, SNAPSHOT_FORMAT)
+        except ValueError:
+            continue
+        snapshots.append((moment, os.path.join(directory, name)))
+    snapshots.sort(reverse=True)
+    return snapshots
+
+
+def snapshot_path(directory):
+    # Свободное имя копии. Копии в одну и ту же секунду (ручная и по
+    # расписанию, два запуска из командной строки) получают суффикс _2, _3...
+    # Временный файл создаётся монопольно: пока копия пишется, имя занято.
+    base = SNAPSHOT_PREFIX + datetime.datetime.now().strftime(SNAPSHOT_FORMAT)
+    repeat = 1
+    while True:
+        path = os.path.join(directory, base + (f"_{repeat}" if repeat > 1 else "") + ".db")
+        repeat += 1
+        try:
+            os.close(os.open(path + ".tmp", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        if os.path.exists(path):
+            os.remove(path + ".tmp")
+            continue
+        return path
+
+
+def retention_key(rule, moment, path):
+    if rule == 'day':
+        return moment.date()
+    if rule == 'week':
+        return tuple(moment.isocalendar())[:2]
+    if rule == 'month':
+        return moment.year, moment.month
+    return path
+
+
+def retained(snapshots, rules=RETENTION):
+    # Пути копий, которые остаются; snapshots — от новых к старым
+    keep = set()
+    for rule, count in rules:
+        buckets = set()
+        for moment, path in snapshots:
+            key = retention_key(rule, moment, path)
+            if key in buckets:
+                continue
+            if len(buckets) >= count:
+                break
+            buckets.add(key)
+            keep.add(path)
+    return keep
+
+
+def prune(directory, rules=RETENTION):
+    snapshots = list_snapshots(directory)
+    keep = retained(snapshots, rules)
+    removed = []
+    for moment, path in snapshots:
+        if path not in keep:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def check_integrity(conn, name):
+    rows = conn.execute("PRAGMA integrity_check").fetchall()
+    if rows != [("ok",)]:
+        problems = "; ".join(row[0] for row in rows[:5])
+        raise sqlite3.DatabaseError(f"{name}: нарушена целостность ({problems})")
+
+
+def copy_database(source, target, progress=None, stop=None):
+    # progress(скопировано страниц, всего); stop — threading.Event для отмены
+    def step(status, remaining, total):
+        if stop is not None and stop.is_set():
+            raise BackupCancelled()
+        if progress is not None:
+            progress(total - remaining, total)
+        time.sleep(BACKUP_PAUSE_S)
+
+    # Читающая транзакция на всё копирование: один снимок WAL
+    source.execute("BEGIN")
+    source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    try:
+        source.backup(target, pages=BACKUP_PAGES, progress=step)
+    finally:
+        source.rollback()
+
+
+def create_snapshot(db_path, directory=None, progress=None, stop=None, rotate=True):
+    # rotate=False — без удаления старых копий (например, перед восстановлением
+    # одной из них)
+    directory = directory or default_directory(db_path)
+    with _lock, psihoz_perf.timed("backup.snapshot") as span:
+        os.makedirs(directory, exist_ok=True)
+        path = snapshot_path(directory)
+        temp = path + ".tmp"
+        source = sqlite3.connect(db_path)
+        configure_connection(source)
+        target = sqlite3.connect(temp)
+        try:
+            copy_database(source, target, progress, stop)
+            # Копия — один самостоятельный файл, без -wal и -shm рядом
+            target.execute("PRAGMA journal_mode = DELETE")
+            check_integrity(target, os.path.basename(path))
+            span.rows = target.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except BaseException:
+            target.close()
+            os.remove(temp)
+            raise
+        finally:
+            source.close()
+        target.close()
+        os.replace(temp, path)
+        if rotate:
+            prune(directory)
+    return path
+
+
+def restore_snapshot(conn, path, progress=None):
+    # Замена содержимого базы соединения conn копией path.
+    # Копия проверяется до замены, база — после.
+    source = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        check_integrity(source, os.path.basename(path))
+        if conn.in_transaction:
+            # Отложенные записи фиксируются: backup не работает внутри транзакции
+            conn.commit()
+        with psihoz_perf.timed("backup.restore"):
+            copy_database(source, conn, progress)
+    finally:
+        source.close()
+    configure_connection(conn)
+    check_integrity(conn, "база после восстановления")
+    # Копия могла быть сделана до последних миграций; версии данных из копии
+    # уже встречались (кэш графиков по версии) — номер базы новый
+    migrate(conn)
+    with conn:
+        renew_database_id(conn)
+    return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class BackupService:
+    # Копия по расписанию в отдельном потоке: при запуске (после
+    # BACKUP_DELAY_S) и затем, как только последней копии больше interval
+    def __init__(self, db_path, directory=None, interval=BACKUP_INTERVAL_S):
+        self.db_path = db_path
+        self.directory = directory or default_directory(db_path)
+        self.interval = interval
+        self.last_path = None
+        self.last_error = None
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="psihoz-backup", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def due(self):
+        snapshots = list_snapshots(self.directory)
+        if not snapshots:
+            return True
+        age = datetime.datetime.now() - snapshots[0][0]
+        return age.total_seconds() >= self.interval
+
+    def run(self):
+        delay = BACKUP_DELAY_S
+        while not self.stopping.wait(delay):
+            delay = BACKUP_CHECK_S
+            try:
+                if self.due():
+                    self.last_path = create_snapshot(self.db_path, self.directory, stop=self.stopping)
+                    self.last_error = None
+            except BackupCancelled:
+                return
+            except Exception as e:
+                # Ошибка не прерывает сервис: следующая попытка — через BACKUP_CHECK_S
+                self.last_error = e
+
+    def stop(self, timeout=None):
+        # Идущая копия прерывается на ближайшем шаге, временный файл удаляется
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Резервные копии базы Psihoz")
+    parser.add_argument("command", choices=("create", "list", "restore", "check"))
+    parser.add_argument("path", nargs="?", help="копия для restore и check")
+    parser.add_argument("--db", default="psihoz.db")
+    parser.add_argument("--dir", help="каталог копий (по умолчанию backups рядом с базой)")
+    args = parser.parse_args()
+    directory = args.dir or default_directory(args.db)
+
+    def show(done, total):
+        print(f"\r{done}/{total} страниц", end="", file=sys.stderr)
+
+    if args.command == "create":
+        path = create_snapshot(args.db, directory, progress=show)
+        print(f"\nКопия: {path}")
+    elif args.command == "list":
+        for moment, path in list_snapshots(directory):
+            print(f"{moment:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) // 1024} КБ  {path}")
+    elif not args.path:
+        parser.error("укажите файл копии")
+    elif args.command == "check":
+        conn = sqlite3.connect(f"file:{os.path.abspath(args.path)}?mode=ro", uri=True)
+        check_integrity(conn, args.path)
+        print("Целостность в порядке")
+    else:
+        conn = sqlite3.connect(args.db)
+        count = restore_snapshot(conn, args.path, progress=show)
+        conn.close()
+        print(f"\nВосстановлено записей: {count}")
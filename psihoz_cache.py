@@ -0,0 +1,202 @@
+import collections
+
+import psihoz_db
+from psihoz_db import MOODS
+
+# Общий колоночный кэш записей для истории и аналитики.
+# Столбцы — массивы NumPy, отсортированные по (ts, id):
+#   ids int64, ts int64 (секунды), moods uint8 (код в mood_names),
+#   sentiment float32 (NaN — нет оценки).
+# Текст (дата, симптомы, начало заметки) хранится отдельно в NoteStore
+# и читается блоками по требованию.
+#
+# Кэш живёт в потоке DbWorker и обновляется точечно при записи через
+# insert_entry/delete_entry. Изменения из других соединений (пересчёт,
+# импорт) видны по PRAGMA data_version — тогда столбцы читаются заново.
+# Скользящая статистика (psihoz_stats) строится по столбцам при первом
+# запросе и дальше обновляется по одной записи вместе с ними.
+# numpy импортируется при первой загрузке, а не при импорте модуля.
+
+NOTE_BLOCK = 256            # записей (по id) в одном блоке текста
+NOTE_BLOCKS = 64            # блоков в памяти
+UNKNOWN_MOOD = 255
+
+
+class NoteStore:
+    # Блок: id строк, смещения и один bytes с текстами в UTF-8
+    def __init__(self, preview_len):
+        self.preview_len = preview_len
+        self.blocks = collections.OrderedDict()
+
+    def block(self, conn, number):
+        if number in self.blocks:
+            self.blocks.move_to_end(number)
+            return self.blocks[number]
+
+        import numpy as np
+        rows = conn.execute('''
+            SELECT id, date, symptoms, substr(note, 1, ?) FROM entries
+            WHERE id BETWEEN ? AND ? ORDER BY id
+        ''', (self.preview_len, number * NOTE_BLOCK, (number + 1) * NOTE_BLOCK - 1)).fetchall()
+        parts = ["\x1f".join((date or "", symptoms or "", note or "")).encode("utf-8")
+                 for entry_id, date, symptoms, note in rows]
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(part) for part in parts])
+        block = (np.array([row[0] for row in rows], dtype=np.int64), offsets, b"".join(parts))
+
+        self.blocks[number] = block
+        if len(self.blocks) > NOTE_BLOCKS:
+            self.blocks.popitem(last=False)
+        return block
+
+    def get(self, conn, entry_ids):
+        # [(date, symptoms, preview)] в порядке entry_ids
+        result = []
+        for entry_id in entry_ids:
+            ids, offsets, blob = self.block(conn, entry_id // NOTE_BLOCK)
+            i = int(ids.searchsorted(entry_id))
+            result.append(tuple(blob[offsets[i]:offsets[i + 1]].decode("utf-8").split("\x1f", 2)))
+        return result
+
+    def invalidate(self, entry_id):
+        self.blocks.pop(entry_id // NOTE_BLOCK, None)
+
+
+class EntryCache:
+    def __init__(self, preview_len=200):
+        self.loaded = False
+        self.data_version = None
+        self.mood_names = list(MOODS)
+        self.notes = NoteStore(preview_len)
+        self.stats = None
+
+    def refresh(self, conn):
+        # Перечитывает столбцы, если база менялась из другого соединения
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if not self.loaded or version != self.data_version:
+            self.load(conn)
+            self.data_version = version
+        return len(self.ids)
+
+    def load(self, conn):
+        import numpy as np
+        # Все запросы — в одном снимке базы: commit другого соединения (импорт,
+        # пересчёт) между COUNT и чтением столбцов не должен их рассогласовать.
+        # Открытая транзакция worker (групповой commit) уже даёт один снимок.
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute("BEGIN")
+        try:
+            # Настроения старых записей (не из MOODS) получают коды после стандартных
+            extra = sorted({mood for mood, total in psihoz_db.fetch_mood_totals(conn)} - set(MOODS))
+            self.mood_names = list(MOODS) + extra[:UNKNOWN_MOOD - len(MOODS)]
+            cases = " ".join("WHEN ? THEN ?" for name in self.mood_names)
+            params = [value for code, name in enumerate(self.mood_names) for value in (name, code)]
+
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            cursor = conn.execute(f'''
+                SELECT id, ts, CASE mood {cases} ELSE {UNKNOWN_MOOD} END, sentiment_score
+                FROM entries ORDER BY ts, id
+            ''', params)
+            columns = np.fromiter(cursor, count=count, dtype=[
+                ('id', np.int64), ('ts', np.int64), ('mood', np.uint8), ('sentiment', np.float32)])
+        finally:
+            if own_transaction:
+                conn.rollback()
+        self.ids = np.ascontiguousarray(columns['id'])
+        self.ts = np.ascontiguousarray(columns['ts'])
+        self.moods = np.ascontiguousarray(columns['mood'])
+        self.sentiment = np.ascontiguousarray(columns['sentiment'])
+        self.notes.blocks.clear()
+        self.stats = None
+        self.loaded = True
+
+    def nbytes(self):
+        if not self.loaded:
+            return 0
+        return (self.ids.nbytes + self.ts.nbytes + self.moods.nbytes + self.sentiment.nbytes
+                + sum(len(blob) + ids.nbytes + offsets.nbytes
+                      for ids, offsets, blob in self.notes.blocks.values()))
+
+    def mood_code(self, mood):
+        if mood not in self.mood_names and len(self.mood_names) < UNKNOWN_MOOD:
+            self.mood_names.append(mood)
+        return self.mood_names.index(mood) if mood in self.mood_names else UNKNOWN_MOOD
+
+    def position(self, ts, entry_id):
+        # Первая позиция с (ts, id) >= ключа
+        low = int(self.ts.searchsorted(ts, 'left'))
+        high = int(self.ts.searchsorted(ts, 'right'))
+        return low + int(self.ids[low:high].searchsorted(entry_id, 'left'))
+
+    # Запись: база + точечное обновление столбцов (выполняется в DbWorker)
+
+    def insert_entry(self, conn, date, ts, mood, note, symptoms, sentiment_score,
+                     note_hash=None, analyzer_version=None):
+        entry_id = psihoz_db.insert_entry(conn, date, ts, mood, note, symptoms, sentiment_score,
+                                          note_hash, analyzer_version)
+        if self.loaded:
+            import numpy as np
+            index = self.position(ts, entry_id)
+            self.ids = np.insert(self.ids, index, entry_id)
+            self.ts = np.insert(self.ts, index, ts)
+            self.moods = np.insert(self.moods, index, self.mood_code(mood))
+            self.sentiment = np.insert(self.sentiment, index,
+                                       np.nan if sentiment_score is None else sentiment_score)
+            self.notes.invalidate(entry_id)
+            if self.stats is not None:
+                self.stats.add(ts, int(self.moods[index]), sentiment_score)
+        return entry_id
+
+    def delete_entry(self, conn, entry_id):
+        psihoz_db.delete_entry(conn, entry_id)
+        if self.loaded:
+            import numpy as np
+            index = np.flatnonzero(self.ids == entry_id)
+            if self.stats is not None:
+                for i in index:
+                    self.stats.add(int(self.ts[i]), int(self.moods[i]), float(self.sentiment[i]), sign=-1)
+            self.ids = np.delete(self.ids, index)
+            self.ts = np.delete(self.ts, index)
+            self.moods = np.delete(self.moods, index)
+            self.sentiment = np.delete(self.sentiment, index)
+            self.notes.invalidate(entry_id)
+
+    # Чтение
+
+    def history_page(self, conn, key, forward, page_size, preview_len):
+        # Те же строки, что psihoz_db.fetch_history_page. Пока кэш не прогрет,
+        # страница читается из базы, чтобы первый экран не ждал загрузки столбцов.
+        if not self.loaded:
+            return psihoz_db.fetch_history_page(conn, key, forward, page_size, preview_len)
+        self.refresh(conn)
+        if preview_len != self.notes.preview_len:
+            self.notes = NoteStore(preview_len)
+
+        if key is None:
+            stop = len(self.ids)
+            start = max(stop - page_size, 0)
+        elif forward:
+            stop = self.position(*key)
+            start = max(stop - page_size, 0)
+        else:
+            start = self.position(*key)
+            if start < len(self.ids) and (self.ts[start], self.ids[start]) == tuple(key):
+                start += 1
+            stop = min(start + page_size, len(self.ids))
+
+        ids = self.ids[start:stop][::-1].tolist()
+        ts = self.ts[start:stop][::-1].tolist()
+        return [(entry_id, moment, date, self.mood_name(code), symptoms, preview)
+                for entry_id, moment, code, (date, symptoms, preview)
+                in zip(ids, ts, self.moods[start:stop][::-1].tolist(), self.notes.get(conn, ids))]
+
+    def statistics(self):
+        # Вызывать после refresh(): при перезагрузке столбцов статистика строится заново
+        if self.stats is None:
+            from psihoz_stats import RollingStats
+            self.stats = RollingStats.from_columns(self.ts, self.moods, self.sentiment)
+        return self.stats
+
+    def mood_name(self, code):
+        return self.mood_names[code] if code < len(self.mood_names) else ""
@@ -0,0 +1,353 @@
+import collections
+import hashlib
+import os
+
+import numpy as np
+
+from psihoz_analytics import RESOLUTIONS
+
+# Графики аналитики с постоянными объектами matplotlib.
+# Столбцы и линия создаются один раз и обновляются через set_height/set_data.
+# Если масштаб осей не изменился, перерисовываются только эти объекты
+# поверх сохранённого фона (blitting), без полного canvas.draw().
+# Линия перед отрисовкой прореживается алгоритмом LTTB до ширины оси в пикселях.
+# SentimentChart получает ряды нескольких разрешений (см. psihoz_analytics).
+#
+# Готовые изображения графиков хранятся в RenderCache по ключу
+# (график, версия данных, диапазон, размер холста): повторный показ того же
+# состояния — копирование пикселей в буфер и blit, без отрисовки matplotlib.
+# Версия — номер базы и счётчик изменений (psihoz_db.fetch_data_version).
+# PSIHOZ_RENDER_CACHE=каталог дополнительно сохраняет изображения на диск
+# (сжатые .npz), и они переживают перезапуск приложения.
+
+MIN_POINTS = 100
+PIXELS_PER_POINT = 4        # ряд «заполняет» ось, если точек не меньше ширина / 4
+ZOOM_STEP = 1.25            # шаг масштаба колесом мыши
+MIN_SPAN_DAYS = 1 / 24      # наибольшее приближение — час
+
+RENDER_CACHE_BYTES = 32 * 1024 * 1024   # изображений в памяти (RGBA)
+RENDER_CACHE_FILES = 64                 # файлов в каталоге на диске
+RENDER_CACHE_DIR = os.environ.get("PSIHOZ_RENDER_CACHE")
+
+# Пресеты диапазона: сколько дней показывать (None — вся история)
+PRESETS = {
+    'week': 7,
+    'month': 30,
+    'year': 365,
+    'all': None,
+}
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: оставляет threshold точек,
+    # сохраняя форму ряда (пики и провалы не теряются)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    bucket = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * bucket).astype(np.int64) + 1
+    edges[-1] = n - 1
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    chosen = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Площадь треугольника (выбранная точка, кандидат, среднее следующей корзины)
+        area = np.abs((x[chosen] - avg_x) * (y[start:end] - y[chosen])
+                      - (x[chosen] - x[start:end]) * (avg_y - y[chosen]))
+        chosen = start + int(area.argmax())
+        keep[i + 1] = chosen
+    return x[keep], y[keep]
+
+
+class RenderCache:
+    # LRU изображений (массивы RGBA) по ключу; вытеснение по объёму
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES, directory=RENDER_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.images = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".npz")
+
+    def get(self, key):
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        elif self.directory:
+            try:
+                with np.load(self.path(key)) as archive:
+                    image = archive['image']
+            except (OSError, KeyError, ValueError):
+                image = None
+            if image is not None:
+                self.remember(key, image)
+        if image is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return image
+
+    def put(self, key, image):
+        self.remember(key, image)
+        if self.directory:
+            self.save(key, image)
+
+    def remember(self, key, image):
+        old = self.images.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self.images[key] = image
+        self.nbytes += image.nbytes
+        while self.nbytes > self.max_bytes and len(self.images) > 1:
+            key, old = self.images.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def save(self, key, image):
+        # Ошибки диска не мешают работе: изображение остаётся в памяти
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(key)
+            temp = path + ".tmp"
+            with open(temp, "wb") as file:
+                np.savez_compressed(file, image=image)
+            os.replace(temp, path)
+            files = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".npz")),
+                           key=lambda entry: entry.stat().st_mtime)
+            for entry in files[:-RENDER_CACHE_FILES]:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        self.images.clear()
+        self.nbytes = 0
+
+
+class BlitManager:
+    # Сохраняет фон оси после полной отрисовки и дорисовывает анимируемые объекты.
+    # С RenderCache запоминает итоговое изображение состояния key и при
+    # повторном redraw с тем же key копирует его в буфер вместо отрисовки.
+    def __init__(self, canvas, artists, cache=None):
+        self.canvas = canvas
+        self.artists = artists
+        self.background = None
+        self.cache = cache
+        self.key = None
+        self.draw_cid = canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_artists()
+        self.store()
+
+    def full_key(self):
+        width, height = self.canvas.get_width_height(physical=True)
+        return self.key + (width, height)
+
+    def store(self):
+        # То же состояние того же размера уже сохранено — изображение не изменилось
+        if self.cache is not None and self.key is not None and self.full_key() not in self.cache.images:
+            self.cache.put(self.full_key(), np.array(self.canvas.buffer_rgba()))
+
+    def paint(self):
+        # Изображение из кэша -> буфер рендерера -> экран
+        if self.cache is None or self.key is None:
+            return False
+        image = self.cache.get(self.full_key())
+        if image is None:
+            return False
+        buffer = np.asarray(self.canvas.get_renderer().buffer_rgba())
+        if buffer.shape != image.shape:
+            return False
+        buffer[...] = image
+        # Фон без анимируемых объектов для этого состояния не сохранён
+        self.background = None
+        self.canvas.blit(self.canvas.figure.bbox)
+        return True
+
+    def draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def freeze(self):
+        # Для savefig: анимируемые объекты в обычную отрисовку не попадают,
+        # а фон для blitting при сохранении не нужен
+        self.canvas.mpl_disconnect(self.draw_cid)
+        self.background = None
+        self.key = None
+        for artist in self.artists:
+            artist.set_animated(False)
+
+    def redraw(self, full, key=None):
+        # key — состояние графика без размера холста; None — не кэшировать
+        self.key = key
+        if self.paint():
+            return
+        if full or self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.store()
+
+
+class MoodChart:
+    def __init__(self, figure, canvas, color, cache=None):
+        self.ax = figure.add_subplot(111)
+        self.ax.set_title('Распределение настроения', fontsize=14, fontweight='bold')
+        self.ax.set_xlabel('Настроение', fontsize=12)
+        self.ax.set_ylabel('Количество записей', fontsize=12)
+        self.color = color
+        self.moods = []
+        self.bars = []
+        self.blit = BlitManager(canvas, self.bars, cache)
+
+    def update(self, moods, counts, version=None):
+        full = False
+        if list(moods) != self.moods:
+            # Набор категорий изменился: пересоздаём столбцы (бывает редко)
+            for bar in self.bars:
+                bar.remove()
+            container = self.ax.bar(range(len(moods)), np.zeros(len(moods)),
+                                    color=self.color, edgecolor='black', animated=True)
+            self.bars[:] = list(container)
+            self.moods = list(moods)
+            self.ax.set_xticks(range(len(moods)))
+            self.ax.set_xticklabels(self.moods, rotation=0)
+            full = True
+
+        for bar, count in zip(self.bars, counts):
+            bar.set_height(count)
+
+        top = max(counts) if len(counts) else 1
+        low, high = self.ax.get_ylim()
+        if top > high or top < high / 2:
+            self.ax.set_ylim(0, top * 1.15)
+            full = True
+        self.blit.redraw(full, None if version is None else ('mood', version))
+
+
+class SentimentChart:
+    # Ось дат с масштабированием колесом мыши, перетаскиванием и пресетами.
+    # Для видимого диапазона берётся самый грубый ряд (месяц/неделя/день/записи),
+    # у которого в окне достаточно точек; выборка окна — бинарный поиск.
+    def __init__(self, figure, canvas, color, cache=None):
+        self.ax = figure.add_subplot(111)
+        self.ax.set_title('Динамика эмоционального состояния', fontsize=14, fontweight='bold')
+        self.ax.set_xlabel('Дата', fontsize=12)
+        self.ax.set_ylabel('Оценка настроения (-1 до 1)', fontsize=12)
+        self.ax.set_ylim(-1.05, 1.05)
+        self.ax.xaxis_date()
+        self.line, = self.ax.plot([], [], color=color, linewidth=2, animated=True)
+        self.canvas = canvas
+        self.series = {}
+        self.version = None
+        self.bounds = None
+        self.preset = 'all'
+        self.resolution = None
+        self.drag_x = None
+        self.blit = BlitManager(canvas, [self.line], cache)
+        canvas.mpl_connect('resize_event', self.on_resize)
+        canvas.mpl_connect('scroll_event', self.on_scroll)
+        canvas.mpl_connect('button_press_event', self.on_press)
+        canvas.mpl_connect('motion_notify_event', self.on_motion)
+        canvas.mpl_connect('button_release_event', self.on_release)
+
+    def pixel_budget(self):
+        return max(int(self.ax.bbox.width), MIN_POINTS)
+
+    def pick_series(self, low, high):
+        # Самый грубый ряд, который «заполняет» окно: не меньше точки на
+        # PIXELS_PER_POINT пикселей; иначе — отдельные записи
+        target = self.pixel_budget() / PIXELS_PER_POINT
+        for resolution in RESOLUTIONS:
+            x, y = self.series[resolution]
+            start, stop = np.searchsorted(x, (low, high))
+            if stop - start >= target or resolution == RESOLUTIONS[-1]:
+                # По точке за краями окна, чтобы линия не обрывалась
+                start, stop = max(start - 1, 0), min(stop + 1, len(x))
+                return resolution, x[start:stop], y[start:stop]
+
+    def set_line_data(self):
+        low, high = self.ax.get_xlim()
+        self.resolution, x, y = self.pick_series(low, high)
+        x, y = lttb(x, y, self.pixel_budget())
+        self.line.set_data(x, y)
+
+    def update(self, series, version=None):
+        self.series = series
+        self.version = version
+        x = series['day'][0]
+        if not len(x):
+            self.bounds = None
+            self.line.set_data([], [])
+            self.blit.redraw(True)
+            return
+        self.bounds = (x[0] - 1, x[-1] + 1)
+        if self.preset is not None:
+            self.show_preset(self.preset)
+        else:
+            self.set_view(*self.ax.get_xlim())
+
+    def show_preset(self, preset):
+        # Пресеты отсчитываются от последней записи
+        self.preset = preset
+        if self.bounds is None:
+            return
+        low, high = self.bounds
+        if PRESETS[preset] is not None:
+            low = max(low, high - PRESETS[preset])
+        self.set_view(low, high)
+
+    def set_view(self, low, high):
+        if self.bounds is None or high - low < MIN_SPAN_DAYS:
+            return
+        self.ax.set_xlim(low, high)
+        self.set_line_data()
+        # Кэшируются только пресеты: при масштабировании колесом и
+        # перетаскивании каждый кадр уникален
+        key = None
+        if self.version is not None and self.preset is not None:
+            key = ('sentiment', self.version, self.preset)
+        self.blit.redraw(True, key)
+
+    def on_scroll(self, event):
+        if event.inaxes is not self.ax or self.bounds is None:
+            return
+        factor = 1 / ZOOM_STEP if event.button == 'up' else ZOOM_STEP
+        low, high = self.ax.get_xlim()
+        center = event.xdata
+        self.preset = None
+        self.set_view(center - (center - low) * factor, center + (high - center) * factor)
+
+    def on_press(self, event):
+        if event.inaxes is self.ax and event.button == 1:
+            self.drag_x = event.x
+
+    def on_motion(self, event):
+        if self.drag_x is None or self.bounds is None:
+            return
+        low, high = self.ax.get_xlim()
+        shift = (self.drag_x - event.x) * (high - low) / self.ax.bbox.width
+        self.drag_x = event.x
+        self.preset = None
+        self.set_view(low + shift, high + shift)
+
+    def on_release(self, event):
+        self.drag_x = None
+
+    def on_resize(self, event):
+        # Другая ширина оси — другое число точек после прореживания
+        if self.bounds is not None:
+            self.set_line_data()
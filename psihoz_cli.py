@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import warnings
+
+from psihoz_analytics import format_statistics, load_analytics, load_statistics, load_summary
+from psihoz_cache import EntryCache
+from psihoz_charts import PRESETS
+from psihoz_db import SCHEMA_VERSION
+
+# Консольный режим без Tk: сводка по дневнику и графики в PNG/SVG.
+# Графики строятся теми же классами, что и во вкладке «Аналитика»,
+# но на холсте Agg, которому не нужен дисплей. Можно передать
+# несколько баз — для каждой печатается сводка и сохраняются файлы.
+#
+# python psihoz_cli.py psihoz.db other.db --out reports --format svg
+
+CHART_COLOR = "#96976B"     # цвет кнопок приложения
+CHART_SIZE = (8, 5)         # дюймы
+CHART_DPI = 100
+
+
+def render_charts(data, stem, out_dir, fmt, preset, dpi):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from psihoz_charts import MoodChart, SentimentChart
+
+    # Эмодзи в подписях настроений есть не во всех шрифтах сервера
+    warnings.filterwarnings("ignore", message="Glyph .* missing from font")
+    paths = []
+    for name, chart_class, update in (
+            ('mood', MoodChart, lambda chart: chart.update(data['moods'], data['mood_counts'])),
+            ('sentiment', SentimentChart, lambda chart: chart.update(data['sentiment']))):
+        figure = Figure(figsize=CHART_SIZE, dpi=dpi, tight_layout=True)
+        canvas = FigureCanvasAgg(figure)
+        chart = chart_class(figure, canvas, CHART_COLOR)
+        if name == 'sentiment':
+            chart.preset = preset
+        update(chart)
+        chart.blit.freeze()
+        path = os.path.join(out_dir, f"{stem}_{name}.{fmt}")
+        figure.savefig(path, format=fmt)
+        paths.append(path)
+    return paths
+
+
+def format_summary(db_path, summary):
+    lines = [f"== {db_path}", f"Записей: {summary['entries']}"]
+    if summary['first_date']:
+        lines.append(f"Период: {summary['first_date']} — {summary['last_date']}")
+    if summary['moods']:
+        lines.append("Настроение:")
+        lines.extend(f"  {mood}: {total} ({share:.0%})" for mood, total, share in summary['moods'])
+    if summary['sentiment_mean'] is not None:
+        lines.append(f"Средняя тональность: {summary['sentiment_mean']:+.3f} "
+                     f"(оценено записей: {summary['scored']})")
+    if summary['sentiment_recent'] is not None:
+        lines.append(f"Тональность за последние дни: {summary['sentiment_recent']:+.3f}")
+    if summary['top_symptoms']:
+        lines.append("Частые симптомы: " + ", ".join(
+            f"{name} ({total})" for name, total in summary['top_symptoms']))
+    if summary.get('statistics') and summary['statistics']['entries']:
+        lines.extend(format_statistics(summary['statistics']))
+    return "\n".join(lines)
+
+
+def report(db_path, out_dir, fmt, preset, dpi, charts=True):
+    # Только чтение: отчёт не меняет файлы дневников. Схему обновляет
+    # приложение (или psihoz_io) при открытии базы
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            raise sqlite3.DatabaseError(f"устаревшая схема базы (версия {version}, нужна "
+                                        f"{SCHEMA_VERSION}); откройте базу в приложении")
+        summary = load_summary(conn)
+        # Один кэш столбцов на статистику и графики
+        cache = EntryCache()
+        summary['statistics'] = load_statistics(conn, cache)
+        summary['charts'] = []
+        if charts:
+            data = load_analytics(conn, cache)
+            if data is not None:
+                stem = os.path.splitext(os.path.basename(db_path))[0]
+                summary['charts'] = render_charts(data, stem, out_dir, fmt, preset, dpi)
+    finally:
+        conn.close()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчёт по дневнику Psihoz без графического интерфейса")
+    parser.add_argument("databases", nargs="+", metavar="db")
+    parser.add_argument("--out", default=".", help="каталог для графиков")
+    parser.add_argument("--format", choices=("png", "svg"), default="png")
+    parser.add_argument("--preset", choices=tuple(PRESETS), default="all",
+                        help="диапазон графика тональности")
+    parser.add_argument("--dpi", type=int, default=CHART_DPI)
+    parser.add_argument("--no-charts", action="store_true", help="только сводка")
+    parser.add_argument("--json", action="store_true", help="сводка в формате JSON")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    results = {}
+    failed = 0
+    for db_path in args.databases:
+        if not os.path.exists(db_path):
+            print(f"Ошибка: файл {db_path} не найден", file=sys.stderr)
+            failed += 1
+            continue
+        try:
+            summary = report(db_path, args.out, args.format, args.preset, args.dpi,
+                             charts=not args.no_charts)
+        except Exception as e:
+            print(f"Ошибка: не удалось обработать {db_path}: {str(e)}", file=sys.stderr)
+            failed += 1
+            continue
+        results[db_path] = summary
+        if not args.json:
+            print(format_summary(db_path, summary))
+            for path in summary['charts']:
+                print(f"График: {path}")
+            print()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
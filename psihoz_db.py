@@ -0,0 +1,599 @@
+import calendar
+import collections
+import datetime
+import json
+import re
+import sqlite3
+import uuid
+
+# Версионируемые миграции схемы базы данных.
+# Номер применённой миграции хранится в PRAGMA user_version.
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+MOODS = ["Отлично 😊", "Хорошо 🙂", "Нормально 😐", "Плохо 🙁", "Ужасно 😞"]
+
+# Форматы, которые встречаются в старых записях (дата вводилась вручную)
+KNOWN_DATE_FORMATS = (
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+)
+
+BACKFILL_CHUNK = 1000
+
+CONTENT_UID_NAMESPACE = uuid.UUID("5b0f3c1e-8a6d-4c55-9a51-70c1d2a9e6f4")
+
+CACHE_SIZE_KIB = 16384      # кэш страниц соединения приложения
+BUSY_TIMEOUT_MS = 5000
+
+
+def parse_date(text):
+    # Строка даты -> секунды "по настенным часам" (без учёта часового пояса)
+    text = (text or "").strip()
+    # Быстрый путь для ISO-дат (основной формат приложения)
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+        return calendar.timegm(moment.replace(tzinfo=None).timetuple())
+    except ValueError:
+        pass
+    for fmt in KNOWN_DATE_FORMATS:
+        try:
+            moment = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return calendar.timegm(moment.timetuple())
+    return None
+
+
+def format_date(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime(DATE_FORMAT)
+
+
+def configure_connection(conn):
+    # WAL: чтение не блокирует запись и наоборот, commit дописывает журнал
+    # без перезаписи базы. synchronous = NORMAL — fsync только при checkpoint;
+    # после сбоя питания могут пропасть последние транзакции, но база цела.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migration_create_entries(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            mood TEXT NOT NULL,
+            note TEXT,
+            symptoms TEXT,
+            sentiment_score REAL
+        )
+    ''')
+
+
+def migration_epoch_timestamps(conn):
+    # Нормализованное время записи в секундах
+    if "ts" not in table_columns(conn, "entries"):
+        conn.execute("ALTER TABLE entries ADD COLUMN ts INTEGER")
+        conn.commit()
+
+    # Заполняем порциями, чтобы не держать большую транзакцию;
+    # при повторном запуске продолжаем с места остановки.
+    # Нераспознанные даты получают 0 и оказываются в конце истории.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, date FROM entries WHERE id > ? AND ts IS NULL ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_CHUNK)).fetchall()
+        if not rows:
+            break
+        conn.executemany("UPDATE entries SET ts = ? WHERE id = ?",
+                         [(parse_date(date) or 0, entry_id) for entry_id, date in rows])
+        conn.commit()
+        last_id = rows[-1][0]
+
+    conn.execute("DROP INDEX IF EXISTS idx_entries_date_id")
+    # История: keyset-пагинация по (ts, id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_ts_id ON entries (ts DESC, id DESC)")
+    # Аналитика: запрос читается целиком из индекса
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_analytics ON entries (ts, mood, sentiment_score)")
+
+
+def migration_sentiment_cache(conn):
+    # Хэш текста заметки и версия анализатора, которым посчитана оценка:
+    # пакетный пересчёт пропускает записи, у которых ничего не изменилось
+    columns = table_columns(conn, "entries")
+    if "note_hash" not in columns:
+        conn.execute("ALTER TABLE entries ADD COLUMN note_hash TEXT")
+    if "analyzer_version" not in columns:
+        conn.execute("ALTER TABLE entries ADD COLUMN analyzer_version TEXT")
+
+
+def migration_daily_rollups(conn):
+    # Агрегаты по дням для аналитики. Поддерживаются триггерами:
+    # вставка обновляет агрегат за O(1), удаление и изменение пересчитывают
+    # один день по индексу idx_entries_analytics.
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS daily_mood (
+            day INTEGER NOT NULL,
+            mood TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, mood)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS daily_sentiment (
+            day INTEGER PRIMARY KEY,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL
+        );
+
+        DELETE FROM daily_mood;
+        DELETE FROM daily_sentiment;
+
+        INSERT INTO daily_mood (day, mood, count)
+        SELECT ts / 86400, mood, COUNT(*) FROM entries GROUP BY ts / 86400, mood;
+
+        INSERT INTO daily_sentiment (day, total, count, min, max)
+        SELECT ts / 86400, SUM(sentiment_score), COUNT(*), MIN(sentiment_score), MAX(sentiment_score)
+        FROM entries WHERE sentiment_score IS NOT NULL GROUP BY ts / 86400;
+
+        CREATE TRIGGER IF NOT EXISTS entries_rollup_insert AFTER INSERT ON entries
+        BEGIN
+            INSERT INTO daily_mood (day, mood, count) VALUES (new.ts / 86400, new.mood, 1)
+            ON CONFLICT (day, mood) DO UPDATE SET count = count + 1;
+
+            INSERT INTO daily_sentiment (day, total, count, min, max)
+            SELECT new.ts / 86400, new.sentiment_score, 1, new.sentiment_score, new.sentiment_score
+            WHERE new.sentiment_score IS NOT NULL
+            ON CONFLICT (day) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + 1,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_rollup_delete AFTER DELETE ON entries
+        BEGIN
+            UPDATE daily_mood SET count = count - 1
+            WHERE day = old.ts / 86400 AND mood = old.mood;
+            DELETE FROM daily_mood
+            WHERE day = old.ts / 86400 AND mood = old.mood AND count <= 0;
+
+            DELETE FROM daily_sentiment WHERE day = old.ts / 86400;
+            INSERT INTO daily_sentiment (day, total, count, min, max)
+            SELECT old.ts / 86400, SUM(sentiment_score), COUNT(*), MIN(sentiment_score), MAX(sentiment_score)
+            FROM entries
+            WHERE ts >= old.ts / 86400 * 86400 AND ts < (old.ts / 86400 + 1) * 86400
+              AND sentiment_score IS NOT NULL
+            HAVING COUNT(*) > 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_rollup_update
+        AFTER UPDATE OF ts, mood, sentiment_score ON entries
+        BEGIN
+            UPDATE daily_mood SET count = count - 1
+            WHERE day = old.ts / 86400 AND mood = old.mood;
+            DELETE FROM daily_mood
+            WHERE day = old.ts / 86400 AND mood = old.mood AND count <= 0;
+            INSERT INTO daily_mood (day, mood, count) VALUES (new.ts / 86400, new.mood, 1)
+            ON CONFLICT (day, mood) DO UPDATE SET count = count + 1;
+
+            DELETE FROM daily_sentiment WHERE day IN (old.ts / 86400, new.ts / 86400);
+            INSERT INTO daily_sentiment (day, total, count, min, max)
+            SELECT ts / 86400, SUM(sentiment_score), COUNT(*), MIN(sentiment_score), MAX(sentiment_score)
+            FROM entries
+            WHERE ((ts >= old.ts / 86400 * 86400 AND ts < (old.ts / 86400 + 1) * 86400)
+                OR (ts >= new.ts / 86400 * 86400 AND ts < (new.ts / 86400 + 1) * 86400))
+              AND sentiment_score IS NOT NULL
+            GROUP BY ts / 86400;
+        END;
+    ''')
+
+
+def split_symptoms(text):
+    # «Головная боль,  бессонница» -> ['головная боль', 'бессонница']
+    names = []
+    for part in (text or "").split(","):
+        name = " ".join(part.split()).lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def link_symptoms(conn, entry_id, text):
+    # Справочник симптомов и связи запись-симптом (без commit)
+    link_symptoms_many(conn, [(entry_id, text)])
+
+
+def link_symptoms_many(conn, entries):
+    # entries: [(entry_id, symptoms_text)]; по одному executemany на таблицу
+    pairs = [(entry_id, name) for entry_id, text in entries for name in split_symptoms(text)]
+    if not pairs:
+        return
+    names = list({name for entry_id, name in pairs})
+    conn.executemany("INSERT INTO symptoms (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+                     [(name,) for name in names])
+    ids = {}
+    for start in range(0, len(names), 500):
+        part = names[start:start + 500]
+        ids.update((name, symptom_id) for symptom_id, name in conn.execute(
+            f"SELECT id, name FROM symptoms WHERE name IN ({','.join('?' * len(part))})", part))
+    conn.executemany("INSERT OR IGNORE INTO entry_symptoms (entry_id, symptom_id) VALUES (?, ?)",
+                     [(entry_id, ids[name]) for entry_id, name in pairs])
+
+
+def migration_symptom_index(conn):
+    # Нормализованные симптомы: справочник и связь с записями.
+    # Связи удаляются триггером вместе с записью.
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS symptoms (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+
+        CREATE TABLE IF NOT EXISTS entry_symptoms (
+            entry_id INTEGER NOT NULL,
+            symptom_id INTEGER NOT NULL,
+            PRIMARY KEY (entry_id, symptom_id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_entry_symptoms_symptom
+        ON entry_symptoms (symptom_id, entry_id);
+
+        CREATE TRIGGER IF NOT EXISTS entries_symptoms_delete AFTER DELETE ON entries
+        BEGIN
+            DELETE FROM entry_symptoms WHERE entry_id = old.id;
+        END;
+    ''')
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, symptoms FROM entries WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_CHUNK)).fetchall()
+        if not rows:
+            break
+        link_symptoms_many(conn, rows)
+        conn.commit()
+        last_id = rows[-1][0]
+
+
+# ё и е в поиске не различаются: в индекс и в запрос попадает «е»
+FTS_NORMALIZE = "replace(replace({0}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fts_available(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'").fetchone() is not None
+
+
+def migration_full_text_search(conn):
+    # Полнотекстовый индекс по заметкам и симптомам (FTS5, внешний контент).
+    # unicode61 приводит кириллицу к нижнему регистру; prefix ускоряет поиск
+    # по началу слова. Без FTS5 в сборке SQLite поиск работает через LIKE.
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                note, symptoms,
+                content='entries', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3 4'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    new_note, new_symptoms = FTS_NORMALIZE.format("new.note"), FTS_NORMALIZE.format("new.symptoms")
+    old_note, old_symptoms = FTS_NORMALIZE.format("old.note"), FTS_NORMALIZE.format("old.symptoms")
+    conn.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries
+        BEGIN
+            INSERT INTO entries_fts (rowid, note, symptoms)
+            VALUES (new.id, {new_note}, {new_symptoms});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries
+        BEGIN
+            INSERT INTO entries_fts (entries_fts, rowid, note, symptoms)
+            VALUES ('delete', old.id, {old_note}, {old_symptoms});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_fts_update AFTER UPDATE OF note, symptoms ON entries
+        BEGIN
+            INSERT INTO entries_fts (entries_fts, rowid, note, symptoms)
+            VALUES ('delete', old.id, {old_note}, {old_symptoms});
+            INSERT INTO entries_fts (rowid, note, symptoms)
+            VALUES (new.id, {new_note}, {new_symptoms});
+        END;
+
+        INSERT INTO entries_fts (rowid, note, symptoms)
+        SELECT id, {FTS_NORMALIZE.format("note")}, {FTS_NORMALIZE.format("symptoms")} FROM entries;
+    ''')
+
+
+def migration_change_counter(conn):
+    # Счётчик изменений записей: растёт при любой вставке, удалении и
+    # изменении, в том числе из другого соединения (пересчёт, импорт).
+    # В отличие от PRAGMA data_version хранится в базе и не сбрасывается
+    # между запусками, поэтому годится как ключ кэша графиков на диске.
+    # Случайный номер базы отличает разные файлы с одинаковым счётчиком.
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+
+        INSERT OR IGNORE INTO counters (name, value) VALUES ('database', abs(random() / 2));
+        INSERT OR IGNORE INTO counters (name, value) VALUES ('entries', 0);
+
+        CREATE TRIGGER IF NOT EXISTS entries_counter_insert AFTER INSERT ON entries
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'entries';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_counter_delete AFTER DELETE ON entries
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'entries';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_counter_update AFTER UPDATE ON entries
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'entries';
+        END;
+    ''')
+
+
+def migration_change_log(conn):
+    # Журнал изменений для синхронизации между устройствами (psihoz_sync).
+    # У записи глобальный uid; вставка и удаление попадают в changes
+    # с логическим временем (часы Лэмпорта, counters.clock). Текст записи
+    # в журнал не копируется — он читается из entries при отправке.
+    # tombstones — удалённые uid: запись, удалённая на любом устройстве,
+    # больше не появляется (вставка и удаление коммутируют).
+    # Пока применяются изменения с сервера, counters.sync_applying = 1
+    # и триггеры их не журналируют.
+    if "uid" not in table_columns(conn, "entries"):
+        conn.execute("ALTER TABLE entries ADD COLUMN uid TEXT")
+    # Уже существующим записям — uid из содержимого: копии одного дневника,
+    # обновлённые по отдельности, получают одинаковые uid и при первой
+    # синхронизации не удваиваются. Одинаковые записи различает номер повтора.
+    repeats = collections.Counter()
+    updates = []
+    for entry_id, *content in conn.execute(
+            "SELECT id, date, mood, note, symptoms FROM entries WHERE uid IS NULL ORDER BY id").fetchall():
+        content = tuple(content)
+        repeats[content] += 1
+        updates.append((content_uid(*content, repeats[content]), entry_id))
+    conn.executemany("UPDATE entries SET uid = ? WHERE id = ?", updates)
+    conn.executescript('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_uid ON entries (uid);
+
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY,
+            uid TEXT NOT NULL,
+            op TEXT NOT NULL,
+            clock INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_changes_clock ON changes (clock);
+
+        CREATE TABLE IF NOT EXISTS tombstones (
+            uid TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value
+        );
+
+        INSERT OR IGNORE INTO sync_state (name, value) VALUES ('device', lower(hex(randomblob(16))));
+        INSERT OR IGNORE INTO sync_state (name, value) VALUES ('pushed', 0);
+        INSERT OR IGNORE INTO sync_state (name, value) VALUES ('pulled', 0);
+        INSERT OR IGNORE INTO counters (name, value) VALUES ('sync_applying', 0);
+
+        -- Уже существующие записи — вставки этого устройства
+        DELETE FROM changes;
+        INSERT INTO changes (uid, op, clock)
+        SELECT uid, 'insert', ROW_NUMBER() OVER (ORDER BY ts, id) FROM entries;
+        INSERT OR REPLACE INTO counters (name, value)
+        VALUES ('clock', (SELECT COUNT(*) FROM entries));
+
+        CREATE TRIGGER IF NOT EXISTS entries_log_insert AFTER INSERT ON entries
+        WHEN (SELECT value FROM counters WHERE name = 'sync_applying') = 0
+        BEGIN
+            UPDATE entries SET uid = lower(hex(randomblob(16))) WHERE id = new.id AND uid IS NULL;
+            UPDATE counters SET value = value + 1 WHERE name = 'clock';
+            INSERT INTO changes (uid, op, clock)
+            VALUES ((SELECT uid FROM entries WHERE id = new.id), 'insert',
+                    (SELECT value FROM counters WHERE name = 'clock'));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS entries_log_delete AFTER DELETE ON entries
+        BEGIN
+            INSERT OR IGNORE INTO tombstones (uid) SELECT old.uid WHERE old.uid IS NOT NULL;
+            UPDATE counters SET value = value + 1
+            WHERE name = 'clock' AND (SELECT value FROM counters WHERE name = 'sync_applying') = 0;
+            INSERT INTO changes (uid, op, clock)
+            SELECT old.uid, 'delete', (SELECT value FROM counters WHERE name = 'clock')
+            WHERE old.uid IS NOT NULL
+              AND (SELECT value FROM counters WHERE name = 'sync_applying') = 0;
+        END;
+    ''')
+
+
+MIGRATIONS = [
+    migration_create_entries,
+    migration_epoch_timestamps,
+    migration_sentiment_cache,
+    migration_daily_rollups,
+    migration_symptom_index,
+    migration_full_text_search,
+    migration_change_counter,
+    migration_change_log,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number in range(version, SCHEMA_VERSION):
+        MIGRATIONS[number](conn)
+        conn.execute(f"PRAGMA user_version = {number + 1}")
+        conn.commit()
+
+
+# Запросы приложения. Принимают соединение первым аргументом,
+# чтобы их можно было выполнять в фоновом потоке (DbWorker).
+
+def fetch_history_page(conn, key, forward, page_size, preview_len):
+    # Keyset-пагинация по индексу (ts, id): без OFFSET и полного чтения таблицы
+    query = f"SELECT id, ts, date, mood, symptoms, substr(note, 1, {int(preview_len)}) FROM entries"
+    if key is None:
+        return conn.execute(query + " ORDER BY ts DESC, id DESC LIMIT ?",
+                            (page_size,)).fetchall()
+    if forward:
+        return conn.execute(query + " WHERE (ts, id) < (?, ?) ORDER BY ts DESC, id DESC LIMIT ?",
+                            (key[0], key[1], page_size)).fetchall()
+    rows = conn.execute(query + " WHERE (ts, id) > (?, ?) ORDER BY ts ASC, id ASC LIMIT ?",
+                        (key[0], key[1], page_size)).fetchall()
+    rows.reverse()
+    return rows
+
+
+# Запись без commit: транзакцию фиксирует вызывающий
+# (DbWorker — групповым commit, см. psihoz_worker)
+
+def new_uid():
+    return uuid.uuid4().hex
+
+
+def content_uid(date, mood, note, symptoms, repeat=1):
+    # Детерминированный uid записи, созданной до журнала изменений
+    content = json.dumps([date, mood, note, symptoms, repeat], ensure_ascii=False)
+    return uuid.uuid5(CONTENT_UID_NAMESPACE, content).hex
+
+
+def insert_entry(conn, date, ts, mood, note, symptoms, sentiment_score,
+                 note_hash=None, analyzer_version=None, uid=None):
+    cursor = conn.execute('''
+        INSERT INTO entries (date, ts, mood, note, symptoms, sentiment_score,
+                             note_hash, analyzer_version, uid)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (date, ts, mood, note, symptoms, sentiment_score, note_hash, analyzer_version,
+          uid or new_uid()))
+    link_symptoms(conn, cursor.lastrowid, symptoms)
+    return cursor.lastrowid
+
+
+def delete_entry(conn, entry_id):
+    conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+
+
+def fetch_mood_totals(conn):
+    return conn.execute('''
+        SELECT mood, SUM(count) AS total FROM daily_mood
+        GROUP BY mood ORDER BY total DESC
+    ''').fetchall()
+
+
+def fetch_symptom_links(conn):
+    # (симптом, день, настроение) для каждой связи: обход индекса связей
+    # и чтение записи по первичному ключу, без разбора строк
+    names = dict(conn.execute("SELECT id, name FROM symptoms"))
+    links = conn.execute('''
+        SELECT es.symptom_id, e.ts / 86400, e.mood
+        FROM entry_symptoms es JOIN entries e ON e.id = es.entry_id
+    ''').fetchall()
+    return names, links
+
+
+def fts_query(text):
+    # «трев бессон» -> "трев"* "бессон"* (все слова, поиск по началу слова)
+    words = re.findall(r"\w+", text.replace("ё", "е").replace("Ё", "Е"))
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_entries(conn, text, limit, preview_len):
+    # Строки в формате fetch_history_page; совпадения выделены «…»
+    if fts_available(conn):
+        query = fts_query(text)
+        if not query:
+            return []
+        # Ранжирование (bm25) по всем совпадениям, а не только по свежим:
+        # сортировка с LIMIT хранит лучшие limit строк (около 20 мс
+        # на 10 тыс. совпадений), запрос выполняется в фоновом потоке
+        return conn.execute(f'''
+            SELECT e.id, e.ts, e.date, e.mood,
+                   highlight(entries_fts, 1, '«', '»'),
+                   snippet(entries_fts, 0, '«', '»', '…', {max(int(preview_len) // 8, 8)})
+            FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+            WHERE entries_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (query, limit)).fetchall()
+
+    # Без FTS5: подстрока, % и _ в запросе — обычные символы
+    escaped = text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%"
+    return conn.execute(f'''
+        SELECT id, ts, date, mood, symptoms, substr(note, 1, {int(preview_len)}) FROM entries
+        WHERE note LIKE ? ESCAPE '\\' OR symptoms LIKE ? ESCAPE '\\'
+        ORDER BY ts DESC, id DESC
+        LIMIT ?
+    ''', (pattern, pattern, limit)).fetchall()
+
+
+def fetch_summary(conn):
+    # Число записей, первая/последняя дата (без нераспознанных, ts = 0)
+    # и средняя тональность
+    return conn.execute('''
+        SELECT COUNT(*),
+               MIN(CASE WHEN ts > 0 THEN ts END), MAX(ts),
+               AVG(sentiment_score), COUNT(sentiment_score)
+        FROM entries
+    ''').fetchone()
+
+
+def fetch_sentiment_mean_since(conn, day):
+    return conn.execute('''
+        SELECT SUM(total) / SUM(count) FROM daily_sentiment WHERE day >= ?
+    ''', (day,)).fetchone()[0]
+
+
+def fetch_top_symptoms(conn, limit):
+    return conn.execute('''
+        SELECT s.name, COUNT(*) AS total
+        FROM entry_symptoms es JOIN symptoms s ON s.id = es.symptom_id
+        GROUP BY es.symptom_id ORDER BY total DESC, s.name LIMIT ?
+    ''', (limit,)).fetchall()
+
+
+def fetch_data_version(conn):
+    # (номер базы, счётчик изменений записей)
+    values = dict(conn.execute("SELECT name, value FROM counters WHERE name IN ('database', 'entries')"))
+    return values.get('database', 0), values.get('entries', 0)
+
+
+def renew_database_id(conn):
+    # После замены содержимого базы (восстановление копии) счётчик откатывается:
+    # новый номер базы не даёт версиям совпасть с уже использованными
+    conn.execute("UPDATE counters SET value = abs(random() / 2) WHERE name = 'database'")
+
+
+def fetch_table_counts(conn):
+    # Размеры основных таблиц для панели диагностики
+    return [(table, conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+            for table in ("entries", "symptoms", "entry_symptoms", "daily_mood", "daily_sentiment")]
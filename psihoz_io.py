@@ -0,0 +1,244 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from psihoz_db import MOODS, format_date, link_symptoms_many, migrate, new_uid, parse_date
+from psihoz_rescore import RESCORE_BATCH, process_pool, score_batch
+from psihoz_sentiment import analyzer_version, note_hash
+
+# Потоковый импорт и экспорт записей: CSV, JSONL и Parquet.
+# Файл читается и пишется порциями, поэтому память не зависит от размера
+# дневника. Импорт вставляет записи executemany по IMPORT_BATCH строк
+# в одной транзакции, тональность считается пачкой в пуле процессов
+# (одинаковые заметки — один раз), пока предыдущая пачка пишется в базу.
+# Parquet требует pyarrow (pip install pyarrow).
+
+FIELDS = ("date", "mood", "symptoms", "note", "sentiment_score")
+FORMATS = ("csv", "jsonl", "parquet")
+
+IMPORT_BATCH = 5000
+EXPORT_CHUNK = 5000
+
+
+def detect_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "json":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {path}")
+    return fmt
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Для Parquet нужен пакет pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+# Чтение файлов: генераторы словарей
+
+def read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_parquet(path):
+    pa, pq = require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=IMPORT_BATCH):
+        yield from batch.to_pylist()
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "parquet": read_parquet}
+
+
+def normalize_mood(text):
+    # «Отлично», «отлично 😊» -> «Отлично 😊»; незнакомые значения как есть
+    text = " ".join(str(text or "").split())
+    word = text.split(" ")[0].lower() if text else ""
+    for mood in MOODS:
+        if mood.split(" ")[0].lower() == word:
+            return mood
+    return text
+
+
+def normalize_record(record):
+    # Проверка и приведение одной записи; None — запись пропускается
+    ts = parse_date(str(record.get("date") or ""))
+    mood = normalize_mood(record.get("mood"))
+    if ts is None or not mood:
+        return None
+    return (format_date(ts), ts, mood,
+            str(record.get("note") or ""), str(record.get("symptoms") or ""))
+
+
+def submit_scores(pool, batch):
+    notes = list(dict.fromkeys(row[3] for row in batch))
+    chunks = [notes[i:i + RESCORE_BATCH] for i in range(0, len(notes), RESCORE_BATCH)]
+    return batch, [(chunk, pool.submit(score_batch, chunk)) for chunk in chunks]
+
+
+def insert_batch(conn, batch, futures):
+    # Ждём оценки пачки, затем одна транзакция на всю пачку
+    scores = {}
+    for chunk, future in futures:
+        scores.update(zip(chunk, future.result()))
+    version = analyzer_version()
+
+    with conn:
+        # Блокировка записи до выбора id: приложение может сохранять записи
+        # одновременно с импортом
+        conn.execute("BEGIN IMMEDIATE")
+        # Явные id: связи с симптомами пишутся без повторного чтения записей.
+        # Следующий id — из sqlite_sequence (AUTOINCREMENT), id удалённых
+        # записей повторно не используются
+        next_id = conn.execute('''
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'entries'), 0),
+                       COALESCE((SELECT MAX(id) FROM entries), 0)) + 1
+        ''').fetchone()[0]
+        conn.executemany('''
+            INSERT INTO entries (id, date, ts, mood, note, symptoms, sentiment_score,
+                                 note_hash, analyzer_version, uid)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(next_id + i, date, ts, mood, note, symptoms, scores[note], note_hash(note), version,
+               new_uid())
+              for i, (date, ts, mood, note, symptoms) in enumerate(batch)])
+        link_symptoms_many(conn, [(next_id + i, row[4]) for i, row in enumerate(batch)])
+
+
+def import_entries(db_path, path, fmt=None, progress=None, workers=None):
+    fmt = detect_format(path, fmt)
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    started = time.perf_counter()
+    imported = skipped = 0
+    batch = []
+    scoring = None
+
+    with process_pool(workers) as pool:
+        for record in READERS[fmt](path):
+            row = normalize_record(record)
+            if row is None:
+                skipped += 1
+                continue
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH:
+                # Пачка уходит на оценку, а в базу пишется предыдущая
+                submitted = submit_scores(pool, batch)
+                if scoring:
+                    insert_batch(conn, *scoring)
+                    imported += len(scoring[0])
+                    if progress:
+                        progress(imported, skipped)
+                scoring = submitted
+                batch = []
+        for pending in (scoring, submit_scores(pool, batch) if batch else None):
+            if pending:
+                insert_batch(conn, *pending)
+                imported += len(pending[0])
+                if progress:
+                    progress(imported, skipped)
+
+    conn.close()
+    return stats(imported, skipped, started)
+
+
+# Экспорт: генератор строк из курсора SQLite (строки читаются по мере обхода)
+
+def iter_entries(conn):
+    cursor = conn.execute('''
+        SELECT date, mood, symptoms, note, sentiment_score FROM entries ORDER BY ts, id
+    ''')
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK)
+        if not rows:
+            return
+        yield rows
+
+
+def write_csv(chunks, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield len(rows)
+
+
+def write_jsonl(chunks, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for rows in chunks:
+            f.writelines(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n"
+                         for row in rows)
+            yield len(rows)
+
+
+def write_parquet(chunks, path):
+    pa, pq = require_pyarrow()
+    schema = pa.schema([("date", pa.string()), ("mood", pa.string()), ("symptoms", pa.string()),
+                        ("note", pa.string()), ("sentiment_score", pa.float64())])
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.table(dict(zip(FIELDS, columns)), schema=schema))
+            yield len(rows)
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def export_entries(db_path, path, fmt=None, progress=None):
+    fmt = detect_format(path, fmt)
+    conn = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    exported = 0
+    for count in WRITERS[fmt](iter_entries(conn), path):
+        exported += count
+        if progress:
+            progress(exported, 0)
+    conn.close()
+    return stats(exported, 0, started)
+
+
+def stats(rows, skipped, started):
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "skipped": skipped,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else rows,
+    }
+
+
+if __name__ == "__main__":
+    # python psihoz_io.py import diary.csv
+    # python psihoz_io.py export diary.parquet --db psihoz.db
+    parser = argparse.ArgumentParser(description="Импорт и экспорт записей Psihoz")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path")
+    parser.add_argument("--db", default="psihoz.db")
+    parser.add_argument("--format", choices=FORMATS)
+    args = parser.parse_args()
+
+    def show(done, skipped):
+        print(f"\r{done} записей", end="", file=sys.stderr)
+
+    if args.command == "import":
+        result = import_entries(args.db, args.path, args.format, progress=show)
+    else:
+        result = export_entries(args.db, args.path, args.format, progress=show)
+    print(f"\nЗаписей: {result['rows']}, пропущено: {result['skipped']}, "
+          f"{result['seconds']} с, {result['rows_per_sec']} записей/с")
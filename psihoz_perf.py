@@ -0,0 +1,126 @@
+import collections
+import os
+import threading
+import time
+
+# Замеры времени обработчиков и их этапов.
+# Каждый замер (имя, мс, строк) попадает в кольцевой буфер последних
+# RING_SIZE замеров; панель диагностики считает по нему p50/p95.
+# Накладные расходы — perf_counter и append в deque.
+#
+# PSIHOZ_PROFILE=каталог включает cProfile: внешний замер в каждом потоке
+# профилируется, статистика копится по имени замера и сохраняется
+# в каталог при закрытии приложения (<имя>.prof, смотреть через pstats/snakeviz).
+
+RING_SIZE = 1000
+PROFILE_DIR = os.environ.get("PSIHOZ_PROFILE")
+
+Sample = collections.namedtuple("Sample", "name ms rows finished thread")
+
+samples = collections.deque(maxlen=RING_SIZE)
+_profiles = {}
+_profile_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    def __init__(self, name, profile=True):
+        self.name = name
+        self.rows = None
+        self.profiler = None
+        if PROFILE_DIR and profile and not getattr(_local, "profiling", False):
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+: профилировщик уже активен в другом потоке
+                profiler = None
+            if profiler is not None:
+                _local.profiling = True
+                self.profiler = profiler
+        self.started = time.perf_counter()
+
+    def finish(self, rows=None):
+        finished = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.disable()
+            _local.profiling = False
+            add_profile(self.name, self.profiler)
+            self.profiler = None
+        if rows is not None:
+            self.rows = rows
+        samples.append(Sample(self.name, (finished - self.started) * 1000, self.rows,
+                              finished, threading.current_thread().name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish()
+        return False
+
+
+def start(name):
+    # Замер, который заканчивается в другом обработчике (например, в callback
+    # фонового потока): профилировать его нельзя, он охватывает цикл Tk
+    return Span(name, profile=False)
+
+
+def timed(name):
+    # with timed("save_entry.score") as span: ...; span.rows = len(rows)
+    return Span(name)
+
+
+def record(name, ms, rows=None):
+    samples.append(Sample(name, ms, rows, time.perf_counter(), threading.current_thread().name))
+
+
+def percentile(values, fraction):
+    # values отсортированы; ближайший ранг
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summary():
+    # [(имя, число, p50, p95, max, среднее число строк)] по кольцевому буферу
+    groups = collections.defaultdict(list)
+    rows = collections.defaultdict(list)
+    for sample in list(samples):
+        groups[sample.name].append(sample.ms)
+        if sample.rows is not None:
+            rows[sample.name].append(sample.rows)
+    result = []
+    for name in sorted(groups):
+        values = sorted(groups[name])
+        mean_rows = sum(rows[name]) / len(rows[name]) if rows[name] else None
+        result.append((name, len(values), percentile(values, 0.5), percentile(values, 0.95),
+                       values[-1], mean_rows))
+    return result
+
+
+def clear():
+    samples.clear()
+
+
+def add_profile(name, profiler):
+    import pstats
+    with _profile_lock:
+        if name in _profiles:
+            _profiles[name].add(profiler)
+        else:
+            _profiles[name] = pstats.Stats(profiler)
+
+
+def dump_profiles(directory=None):
+    directory = directory or PROFILE_DIR
+    if not directory:
+        return []
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    with _profile_lock:
+        for name, stats in _profiles.items():
+            path = os.path.join(directory, f"{name}.prof")
+            stats.dump_stats(path)
+            paths.append(path)
+    return paths
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from psihoz_sentiment import analyzer_version, note_hash, score_note
+
+# Пакетный пересчёт sentiment_score для всех записей.
+# Записи читаются порциями по id, заметки оцениваются в пуле процессов,
+# результаты записываются executemany одной транзакцией на порцию.
+# Заметки с тем же хэшем и той же версией анализатора пропускаются.
+
+RESCORE_CHUNK = 5000        # записей на одну транзакцию
+RESCORE_BATCH = 250         # заметок на одну задачу пула
+RESCORE_CACHE_LIMIT = 100000
+
+
+def process_pool(workers=None):
+    # spawn, а не fork: пул запускается из многопоточного процесса приложения
+    # (DbWorker, живая оценка, резервные копии) — при fork дочерний процесс
+    # унаследовал бы захваченные блокировки и открытое соединение со словарём
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def score_batch(notes):
+    # Выполняется в дочернем процессе
+    return [score_note(note) for note in notes]
+
+
+def rescore_entries(db_path, progress=None, workers=None, force=False):
+    version = analyzer_version()
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    done = scored = 0
+    # Одинаковые тексты (например, пустые заметки) оцениваются один раз
+    cache = {}
+    if progress:
+        progress(done, total)
+
+    with process_pool(workers) as pool:
+        last_id = 0
+        while True:
+            rows = conn.execute('''
+                SELECT id, note, note_hash, analyzer_version, sentiment_score
+                FROM entries WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, RESCORE_CHUNK)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            stale = []
+            for entry_id, note, old_hash, old_version, old_score in rows:
+                digest = note_hash(note)
+                if (not force and digest == old_hash and old_version == version
+                        and old_score is not None):
+                    continue
+                stale.append((entry_id, note or "", digest))
+
+            chunk_scores = {}
+            missing = {}
+            for entry_id, note, digest in stale:
+                if digest in cache:
+                    chunk_scores[digest] = cache[digest]
+                else:
+                    missing[digest] = note
+            if missing:
+                digests = list(missing)
+                notes = [missing[digest] for digest in digests]
+                batches = [notes[i:i + RESCORE_BATCH] for i in range(0, len(notes), RESCORE_BATCH)]
+                scores = [score for batch in pool.map(score_batch, batches) for score in batch]
+                chunk_scores.update(zip(digests, scores))
+                if len(cache) + len(digests) > RESCORE_CACHE_LIMIT:
+                    cache.clear()
+                cache.update(zip(digests, scores))
+
+            if stale:
+                conn.executemany('''
+                    UPDATE entries SET sentiment_score = ?, note_hash = ?, analyzer_version = ?
+                    WHERE id = ?
+                ''', [(chunk_scores[digest], digest, version, entry_id) for entry_id, note, digest in stale])
+                conn.commit()
+                scored += len(stale)
+
+            done += len(rows)
+            if progress:
+                progress(done, total)
+
+    conn.close()
+    return scored
+
+
+if __name__ == "__main__":
+    # python psihoz_rescore.py [psihoz.db] [--force]
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    path = args[0] if args else "psihoz.db"
+    count = rescore_entries(path,
+                            progress=lambda done, total: print(f"\r{done}/{total}", end="", file=sys.stderr),
+                            force="--force" in sys.argv)
+    print(f"\nПересчитано записей: {count}")
@@ -0,0 +1,188 @@
+import functools
+import hashlib
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+
+# Анализ тональности заметок.
+# nltk и словарь VADER загружаются при первом обращении, а не при импорте:
+# на старте окна они не нужны, а загрузка словаря может уйти в сеть.
+#
+# Словарь VADER поставляется вместе с приложением в скомпилированном виде
+# (vader_lexicon.db): отсортированная таблица SQLite, которая читается через
+# mmap. Разбирать текстовый файл и обращаться к nltk_data не нужно.
+
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vader_lexicon.db')
+LEXICON_SOURCE = 'sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt'
+LEXICON_MMAP_SIZE = 8 * 1024 * 1024
+LEXICON_CACHE_SIZE = 4096
+
+# Живая оценка при наборе: кэш валентностей слов по абзацам
+LIVE_CACHE_SIZE = 2048
+
+# Меняется при изменении правил подсчёта оценки
+SCORER_VERSION = "vader-1"
+
+_analyzer = None
+_lock = threading.Lock()
+
+
+class CompiledLexicon:
+    # Только чтение; у каждого потока своё соединение
+    def __init__(self, path):
+        self.path = path
+        self.uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+        self.local = threading.local()
+        self.lookup = functools.lru_cache(maxsize=LEXICON_CACHE_SIZE)(self.fetch)
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True)
+            conn.execute(f"PRAGMA mmap_size = {LEXICON_MMAP_SIZE}")
+            self.local.conn = conn
+        return conn
+
+    def fetch(self, token):
+        row = self.connection().execute(
+            "SELECT valence FROM lexicon WHERE token = ?", (token,)).fetchone()
+        return row[0] if row else None
+
+    def version(self):
+        row = self.connection().execute(
+            "SELECT value FROM meta WHERE key = 'source_sha1'").fetchone()
+        return row[0] if row else None
+
+    # Интерфейс словаря, который использует SentimentIntensityAnalyzer
+    def __contains__(self, token):
+        return self.lookup(token) is not None
+
+    def __getitem__(self, token):
+        valence = self.lookup(token)
+        if valence is None:
+            raise KeyError(token)
+        return valence
+
+    def get(self, token, default=None):
+        valence = self.lookup(token)
+        return default if valence is None else valence
+
+
+def compile_lexicon(text, target=LEXICON_PATH):
+    # Текст vader_lexicon.txt -> vader_lexicon.db
+    entries = {}
+    for line in text.split("\n"):
+        parts = line.strip().split("\t")
+        if len(parts) >= 2:
+            entries[parts[0]] = float(parts[1])
+
+    temp = target + ".tmp"
+    if os.path.exists(temp):
+        os.remove(temp)
+    conn = sqlite3.connect(temp)
+    conn.execute("CREATE TABLE lexicon (token TEXT PRIMARY KEY, valence REAL NOT NULL) WITHOUT ROWID")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+    conn.executemany("INSERT INTO lexicon VALUES (?, ?)", sorted(entries.items()))
+    conn.execute("INSERT INTO meta VALUES ('source_sha1', ?)",
+                 (hashlib.sha1(text.encode('utf-8')).hexdigest(),))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(temp, target)
+    return len(entries)
+
+
+def get_analyzer():
+    global _analyzer
+    with _lock:
+        if _analyzer is None:
+            if os.path.exists(LEXICON_PATH):
+                # Готовый словарь: конструктор не читает файлов и не ходит в сеть
+                from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+                analyzer = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+                analyzer.lexicon = CompiledLexicon(LEXICON_PATH)
+                analyzer.constants = VaderConstants()
+                _analyzer = analyzer
+            else:
+                import nltk
+                from nltk.sentiment import SentimentIntensityAnalyzer
+                try:
+                    nltk.data.find('sentiment/vader_lexicon.zip')
+                except LookupError:
+                    nltk.download('vader_lexicon', quiet=True)
+                _analyzer = SentimentIntensityAnalyzer()
+        return _analyzer
+
+
+def score_note(note):
+    return get_analyzer().polarity_scores(note)['compound']
+
+
+@functools.lru_cache(maxsize=LIVE_CACHE_SIZE)
+def paragraph_valences(paragraph):
+    # (слова, валентности слов) абзаца — первая половина polarity_scores
+    # VADER, до правила «but»
+    from nltk.sentiment.vader import SentiText
+    analyzer = get_analyzer()
+    sentitext = SentiText(paragraph, analyzer.constants.PUNC_LIST,
+                          analyzer.constants.REGEX_REMOVE_PUNCTUATION)
+    words = sentitext.words_and_emoticons
+    first_index = {}
+    for index, word in enumerate(words):
+        first_index.setdefault(word, index)
+    sentiments = []
+    for word in words:
+        index = first_index[word]
+        if (index < len(words) - 1 and word.lower() == "kind" and words[index + 1].lower() == "of") \
+                or word.lower() in analyzer.constants.BOOSTER_DICT:
+            sentiments.append(0)
+            continue
+        sentiments = analyzer.sentiment_valence(0, sentitext, word, index, sentiments)
+    return tuple(words), tuple(sentiments)
+
+
+def score_live(text):
+    # Оценка для индикатора на вкладке «Новая запись». Валентности слов
+    # каждого абзаца считаются один раз (кэш), при правке — только у него.
+    # Правило «but», усиление «!»/«?» и нормализация VADER применяются
+    # к заметке целиком, как в score_note: оценка совпадает с сохраняемой
+    # (кроме отрицаний и усилителей на стыке абзацев).
+    paragraphs = [line.strip() for line in (text or "").split("\n") if line.strip()]
+    if not paragraphs:
+        return None
+    words, sentiments = [], []
+    for paragraph in paragraphs:
+        paragraph_words, paragraph_sentiments = paragraph_valences(paragraph)
+        words.extend(paragraph_words)
+        sentiments.extend(paragraph_sentiments)
+    analyzer = get_analyzer()
+    sentiments = analyzer._but_check(words, sentiments)
+    return analyzer.score_valence(sentiments, "\n".join(paragraphs))['compound']
+
+
+def note_hash(note):
+    return hashlib.sha1((note or "").encode('utf-8')).hexdigest()
+
+
+def analyzer_version():
+    # Версия = правила подсчёта + содержимое словаря
+    analyzer = get_analyzer()
+    if isinstance(analyzer.lexicon, CompiledLexicon):
+        lexicon = analyzer.lexicon.version()
+    else:
+        lexicon = "nltk"
+    return f"{SCORER_VERSION}:{lexicon}"
+
+
+if __name__ == "__main__":
+    # Пересборка словаря: python psihoz_sentiment.py [vader_lexicon.txt]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            source = f.read()
+    else:
+        import nltk
+        source = nltk.data.load(LEXICON_SOURCE, format='text')
+    count = compile_lexicon(source)
+    print(f"Словарь сохранён в {LEXICON_PATH}: {count} слов")
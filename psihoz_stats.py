@@ -0,0 +1,240 @@
+import math
+
+from psihoz_db import MOODS
+
+# Скользящая статистика дневника: средняя тональность и её разброс
+# за последние 7/30/90 дней, серии плохих дней, профили по дням недели
+# и часам суток.
+#
+# По дням (от первой до последней записи, без пропусков) хранятся
+# префиксные суммы тональности — число оценок, сумма, сумма квадратов, —
+# так что окно любой длины считается двумя вычитаниями. Начальное
+# построение — np.bincount по столбцам кэша записей. Новая запись
+# в последний день меняет последние элементы массивов: O(1); для новых
+# дней массивы растут с запасом (удвоением), как list. Запись
+# задним числом сдвигает префиксы от своего дня до конца (срез NumPy),
+# правка дня в середине серии пересчитывает серии заново. Если удалены
+# все записи последнего дня, массивы укорачиваются до предыдущего дня
+# с записями.
+#
+# Время — секунды «по настенным часам» (psihoz_db.parse_date), поэтому
+# день недели и час берутся прямо из ts. Записи с ts <= 0 (дата не
+# распознана) в статистику не попадают.
+
+WINDOWS = (7, 30, 90)       # дней в скользящих окнах
+BAD_MOOD = 3                # код «Плохо» в MOODS: день плохой, если среднее не лучше
+PROFILE_COLUMNS = 4         # записей, оценено, сумма тональности, плохих записей
+
+
+class RollingStats:
+    def __init__(self):
+        import numpy as np
+        self.first_day = None
+        self.size = 0               # дней от первой до последней записи
+        self.entries = 0
+        # Префиксы: элемент i — итог по дням < i, значимы первые size + 1;
+        # дальше — запас под новые дни
+        self.cum_count = np.zeros(1, dtype=np.int64)
+        self.cum_sum = np.zeros(1)
+        self.cum_sq = np.zeros(1)
+        self.mood_count = np.zeros(0, dtype=np.int64)
+        self.mood_sum = np.zeros(0, dtype=np.int64)
+        self.day_count = np.zeros(0, dtype=np.int64)     # записей за день
+        self.weekdays = np.zeros((7, PROFILE_COLUMNS))
+        self.hours = np.zeros((24, PROFILE_COLUMNS))
+        # Серия, закончившаяся днём до последнего, и рекорд до него
+        self.run_before_last = 0
+        self.longest_before_last = 0
+        self.current = 0
+        self.longest = 0
+
+    @classmethod
+    def from_columns(cls, ts, moods, sentiment):
+        # ts, moods, sentiment — столбцы psihoz_cache.EntryCache
+        import numpy as np
+        stats = cls()
+        valid = ts > 0
+        if not valid.any():
+            return stats
+        ts = ts[valid]
+        moods = moods[valid]
+        sentiment = sentiment[valid].astype(np.float64)
+        days = ts // 86400
+        stats.first_day = int(days.min())
+        stats.size = int(days.max()) - stats.first_day + 1
+        stats.entries = len(ts)
+        offsets = days - stats.first_day
+
+        scored = ~np.isnan(sentiment)
+        scores = sentiment[scored]
+        for name, weights in (('cum_count', None), ('cum_sum', scores), ('cum_sq', scores * scores)):
+            totals = np.bincount(offsets[scored], weights=weights, minlength=stats.size)
+            prefix = np.zeros(stats.size + 1, dtype=totals.dtype)
+            np.cumsum(totals, out=prefix[1:])
+            setattr(stats, name, prefix)
+
+        stats.day_count = np.bincount(offsets, minlength=stats.size)
+        known = moods < len(MOODS)
+        stats.mood_count = np.bincount(offsets[known], minlength=stats.size)
+        stats.mood_sum = np.bincount(offsets[known], weights=moods[known],
+                                     minlength=stats.size).astype(np.int64)
+
+        bad = (moods >= BAD_MOOD) & known
+        for profile, keys, bins in ((stats.weekdays, (days + 3) % 7, 7),
+                                    (stats.hours, ts % 86400 // 3600, 24)):
+            profile[:, 0] = np.bincount(keys, minlength=bins)
+            profile[:, 1] = np.bincount(keys[scored], minlength=bins)
+            profile[:, 2] = np.bincount(keys[scored], weights=scores, minlength=bins)
+            profile[:, 3] = np.bincount(keys[bad], minlength=bins)
+        stats.update_streaks()
+        return stats
+
+    # Обновление по одной записи
+
+    def add(self, ts, mood_code, sentiment, sign=1):
+        # sign = -1 — удаление записи с теми же значениями
+        if ts <= 0:
+            return
+        day = ts // 86400
+        index = self.day_index(day)
+        self.entries += sign
+        self.day_count[index] += sign
+        scored = sentiment is not None and not math.isnan(sentiment)
+        if scored:
+            self.cum_count[index + 1:self.size + 1] += sign
+            self.cum_sum[index + 1:self.size + 1] += sign * sentiment
+            self.cum_sq[index + 1:self.size + 1] += sign * sentiment * sentiment
+
+        known = mood_code < len(MOODS)
+        if known:
+            was_bad = self.is_bad(index)
+            self.mood_count[index] += sign
+            self.mood_sum[index] += sign * mood_code
+            if index == self.size - 1:
+                self.current = self.run_before_last + 1 if self.is_bad(index) else 0
+                self.longest = max(self.longest_before_last, self.current)
+            elif self.is_bad(index) != was_bad:
+                self.update_streaks()
+
+        bad = known and mood_code >= BAD_MOOD
+        for profile, key in ((self.weekdays, (day + 3) % 7), (self.hours, ts % 86400 // 3600)):
+            profile[key] += (sign, sign if scored else 0,
+                             sign * sentiment if scored else 0.0, sign if bad else 0)
+        if index == self.size - 1 and not self.day_count[index]:
+            self.trim()
+
+    def day_index(self, day):
+        # Индекс дня; массивы расширяются, если день вне диапазона
+        import numpy as np
+        if self.first_day is None:
+            self.first_day = day
+        if day < self.first_day:
+            # Запись раньше первой: редкий случай, массивы сдвигаются целиком
+            shift = self.first_day - day
+            self.cum_count = np.concatenate([np.zeros(shift, dtype=np.int64), self.cum_count])
+            self.cum_sum = np.concatenate([np.zeros(shift), self.cum_sum])
+            self.cum_sq = np.concatenate([np.zeros(shift), self.cum_sq])
+            self.mood_count = np.concatenate([np.zeros(shift, dtype=np.int64), self.mood_count])
+            self.mood_sum = np.concatenate([np.zeros(shift, dtype=np.int64), self.mood_sum])
+            self.day_count = np.concatenate([np.zeros(shift, dtype=np.int64), self.day_count])
+            self.first_day = day
+            self.size += shift
+            self.update_streaks()
+        index = day - self.first_day
+        if index >= self.size:
+            self.extend(index + 1)
+        return index
+
+    def extend(self, size):
+        # Новый последний день: серия до него — это серия бывшего последнего дня
+        import numpy as np
+        if size + 1 > len(self.cum_count):
+            capacity = max(2 * len(self.cum_count), size + 1)
+            for name in ('cum_count', 'cum_sum', 'cum_sq', 'mood_count', 'mood_sum', 'day_count'):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype=old.dtype)
+                grown[:len(old)] = old
+                setattr(self, name, grown)
+        for prefix in (self.cum_count, self.cum_sum, self.cum_sq):
+            prefix[self.size + 1:size + 1] = prefix[self.size]
+        gap = size - self.size
+        # Пропущенные дни (без записей) прерывают серию
+        self.run_before_last = self.current if gap == 1 else 0
+        self.longest_before_last = self.longest
+        self.current = 0
+        self.size = size
+
+    def trim(self):
+        # Последний день опустел: конец — предыдущий день с записями
+        import numpy as np
+        days = np.flatnonzero(self.day_count[:self.size])
+        if not len(days):
+            self.first_day = None
+            self.size = 0
+            self.current = self.longest = 0
+            self.run_before_last = self.longest_before_last = 0
+            return
+        self.size = int(days[-1]) + 1
+        self.update_streaks()
+
+    def is_bad(self, index):
+        count = self.mood_count[index]
+        return bool(count > 0 and self.mood_sum[index] >= BAD_MOOD * count)
+
+    def update_streaks(self):
+        # Длины серий плохих дней для всех дней сразу
+        import numpy as np
+        if not self.size:
+            return
+        counts = self.mood_count[:self.size]
+        bad = (counts > 0) & (self.mood_sum[:self.size] >= BAD_MOOD * counts)
+        positions = np.arange(self.size)
+        last_good = np.maximum.accumulate(np.where(bad, -1, positions))
+        runs = np.where(bad, positions - last_good, 0)
+        self.current = int(runs[-1])
+        self.longest = int(runs.max())
+        self.run_before_last = int(runs[-2]) if self.size > 1 else 0
+        self.longest_before_last = int(runs[:-1].max()) if self.size > 1 else 0
+
+    # Чтение
+
+    def window(self, days):
+        # (оценок, среднее, стандартное отклонение) за days дней до последней записи
+        start = max(self.size - days, 0)
+        count = int(self.cum_count[self.size] - self.cum_count[start])
+        if count <= 0:
+            return 0, None, None
+        mean = (self.cum_sum[self.size] - self.cum_sum[start]) / count
+        variance = (self.cum_sq[self.size] - self.cum_sq[start]) / count - mean * mean
+        return count, float(mean), math.sqrt(max(variance, 0.0))
+
+    def rolling(self, days):
+        # Ряды для графика: (дни от 1970-01-01, среднее, отклонение) по окну
+        # длиной days, заканчивающемуся каждым днём; NaN — в окне нет оценок
+        import numpy as np
+        ends = np.arange(1, self.size + 1)
+        starts = np.maximum(ends - days, 0)
+        counts = (self.cum_count[ends] - self.cum_count[starts]).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (self.cum_sum[ends] - self.cum_sum[starts]) / counts
+            variance = (self.cum_sq[ends] - self.cum_sq[starts]) / counts - mean * mean
+        first_day = self.first_day or 0
+        return first_day + ends - 0.5, mean, np.sqrt(np.maximum(variance, 0.0))
+
+    def snapshot(self):
+        # Итоги в простых типах Python: для вкладки «Аналитика» и JSON-отчёта
+        return {
+            'entries': self.entries,
+            'windows': [(days,) + self.window(days) for days in WINDOWS],
+            'streak_current': self.current,
+            'streak_longest': self.longest,
+            'weekdays': profile_rows(self.weekdays),
+            'hours': profile_rows(self.hours),
+        }
+
+
+def profile_rows(profile):
+    # [(записей, оценено, средняя тональность или None, доля плохих записей)]
+    return [(int(entries), int(scored), float(total / scored) if scored else None,
+             float(bad / entries) if entries else 0.0)
+            for entries, scored, total, bad in profile.tolist()]
@@ -0,0 +1,368 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psihoz_perf
+from psihoz_db import configure_connection, insert_entry, migrate, new_uid
+
+# Синхронизация дневника между устройствами через журнал изменений.
+#
+# Каждое устройство пишет в changes свои вставки и удаления (триггеры,
+# см. psihoz_db.migration_change_log) с uid записи и логическим временем.
+# sync() отправляет на сервер только изменения после курсора pushed
+# и забирает чужие изменения после курсора pulled — пачками по SYNC_BATCH,
+# JSON в gzip. Объём и время зависят от числа изменений, а не от размера
+# дневника (первая синхронизация передаёт все записи один раз).
+#
+# Слияние без конфликтов: записи не редактируются, поэтому состояние —
+# множество вставленных uid минус множество удалённых (tombstones).
+# Повторная вставка того же uid ничего не меняет, удаление побеждает
+# вставку в любом порядке прихода, так что результат не зависит от
+# порядка и повторов пачек. Часы Лэмпорта (counters.clock) при получении
+# сдвигаются на максимум полученного — порядок изменений согласован
+# между устройствами; сервер по (device, clock) отбрасывает повторы.
+#
+# Копия файла базы (резервная копия, второй компьютер) уносит с собой номер
+# устройства. Совпадение замечается: сервер отклоняет (device, clock) с другим
+# изменением, а клиент сверяет свои изменения, вернувшиеся с сервера (без
+# текста записи), со своим журналом. Тогда устройство получает новый номер
+# и забирает журнал сервера заново — sync() сообщает об этом в device_renewed.
+#
+# Сервер — небольшой HTTP поверх SQLite (для тестов и домашней сети):
+# python psihoz_sync.py serve --port 8765
+# python psihoz_sync.py sync --db psihoz.db --url http://127.0.0.1:8765
+
+SYNC_URL = os.environ.get("PSIHOZ_SYNC_URL", "http://127.0.0.1:8765")
+SYNC_BATCH = 500            # изменений в одном запросе
+SYNC_TIMEOUT_S = 30
+SERVER_STORE = "psihoz_sync_server.db"
+SERVER_PORT = 8765
+
+ENTRY_FIELDS = ("date", "ts", "mood", "note", "symptoms", "sentiment_score",
+                "note_hash", "analyzer_version")
+
+
+class DeviceConflict(Exception):
+    # Номер устройства используется и другой копией базы
+    pass
+
+
+def encode(payload):
+    return gzip.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode(body):
+    return json.loads(gzip.decompress(body))
+
+
+# Клиент
+
+def sync_state(conn):
+    return dict(conn.execute("SELECT name, value FROM sync_state"))
+
+
+def set_state(conn, name, value):
+    conn.execute("UPDATE sync_state SET value = ? WHERE name = ?", (value, name))
+
+
+def local_changes(conn, after, limit):
+    # (последний seq, изменения) после курсора. Текст записи читается из
+    # entries; вставка уже удалённой записи не отправляется — её удаление
+    # идёт следом в том же журнале.
+    fields = ", ".join(f"e.{field}" for field in ENTRY_FIELDS)
+    rows = conn.execute(f'''
+        SELECT c.seq, c.uid, c.op, c.clock, e.id, {fields}
+        FROM changes c LEFT JOIN entries e ON c.op = 'insert' AND e.uid = c.uid
+        WHERE c.seq > ? ORDER BY c.seq LIMIT ?
+    ''', (after, limit)).fetchall()
+    changes = []
+    for seq, uid, op, clock, entry_id, *values in rows:
+        if op == 'insert':
+            if entry_id is None:
+                continue
+            changes.append({"uid": uid, "op": op, "clock": clock, "entry": dict(zip(ENTRY_FIELDS, values))})
+        else:
+            changes.append({"uid": uid, "op": op, "clock": clock})
+    return (rows[-1][0] if rows else after), changes
+
+
+def check_own_changes(conn, device, changes):
+    # Изменения под своим номером должны быть в своём журнале
+    for change in changes:
+        if change["device"] != device:
+            continue
+        known = conn.execute("SELECT 1 FROM changes WHERE clock = ? AND uid = ? AND op = ?",
+                             (change["clock"], change["uid"], change["op"])).fetchone()
+        if known is None:
+            raise DeviceConflict(f"изменение {change['clock']} на сервере сделано другой копией базы")
+
+
+def apply_changes(conn, changes, device=None):
+    # Чужие изменения одной транзакцией (вызывающий делает commit).
+    # Возвращает число изменённых записей.
+    applied = 0
+    conn.execute("UPDATE counters SET value = 1 WHERE name = 'sync_applying'")
+    for change in sorted(changes, key=lambda change: (change["clock"], change["device"])):
+        if change["device"] == device:
+            continue
+        uid = change["uid"]
+        if change["op"] == 'delete':
+            conn.execute("INSERT OR IGNORE INTO tombstones (uid) VALUES (?)", (uid,))
+            applied += conn.execute("DELETE FROM entries WHERE uid = ?", (uid,)).rowcount
+        elif change["op"] == 'insert':
+            known = conn.execute('''
+                SELECT 1 FROM entries WHERE uid = ?
+                UNION ALL SELECT 1 FROM tombstones WHERE uid = ?
+            ''', (uid, uid)).fetchone()
+            if known is None:
+                entry = change["entry"]
+                insert_entry(conn, *(entry.get(field) for field in ENTRY_FIELDS), uid=uid)
+                applied += 1
+    if changes:
+        conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'clock'",
+                     (max(change["clock"] for change in changes),))
+    conn.execute("UPDATE counters SET value = 0 WHERE name = 'sync_applying'")
+    return applied
+
+
+def request(url, path, params, payload=None):
+    # (ответ, байт отправлено, байт получено)
+    address = f"{url.rstrip('/')}{path}?{urllib.parse.urlencode(params)}"
+    body = encode(payload) if payload is not None else None
+    req = urllib.request.Request(address, data=body, method="POST" if body is not None else "GET",
+                                 headers={"Content-Type": "application/json",
+                                          "Content-Encoding": "gzip",
+                                          "Accept-Encoding": "gzip"})
+    try:
+        with urllib.request.urlopen(req, timeout=SYNC_TIMEOUT_S) as response:
+            data = response.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 409:
+            raise DeviceConflict(decode(e.read())["error"]) from None
+        raise
+    return decode(data), len(body or b""), len(data)
+
+
+def exchange(conn, url, batch, stats, progress):
+    state = sync_state(conn)
+    device, pushed, pulled = state["device"], int(state["pushed"]), int(state["pulled"])
+
+    # Отправка своих изменений
+    while True:
+        last, changes = local_changes(conn, pushed, batch)
+        if last == pushed:
+            break
+        if changes:
+            result, sent, received = request(url, "/push", {"device": device}, {"changes": changes})
+            stats["sent_bytes"] += sent
+            stats["received_bytes"] += received
+            stats["pushed"] += len(changes)
+        pushed = last
+        with conn:
+            set_state(conn, "pushed", pushed)
+        if progress is not None:
+            progress(stats["pushed"], stats["pulled"])
+
+    # Получение чужих: изменения и курсор фиксируются вместе
+    while True:
+        result, sent, received = request(url, "/pull", {"device": device, "since": pulled,
+                                                        "limit": batch})
+        stats["sent_bytes"] += sent
+        stats["received_bytes"] += received
+        check_own_changes(conn, device, result["changes"])
+        with conn:
+            stats["applied"] += apply_changes(conn, result["changes"], device)
+            pulled = result["seq"]
+            set_state(conn, "pulled", pulled)
+        stats["pulled"] += sum(change["device"] != device for change in result["changes"])
+        if progress is not None:
+            progress(stats["pushed"], stats["pulled"])
+        if not result["more"]:
+            break
+
+
+def sync(db_path, url=SYNC_URL, progress=None, batch=SYNC_BATCH):
+    # progress(отправлено, получено) — после каждой пачки
+    started = time.perf_counter()
+    stats = {"pushed": 0, "pulled": 0, "applied": 0, "sent_bytes": 0, "received_bytes": 0,
+             "device_renewed": False}
+    conn = sqlite3.connect(db_path)
+    configure_connection(conn)
+    try:
+        migrate(conn)
+        with psihoz_perf.timed("sync") as span:
+            try:
+                exchange(conn, url, batch, stats, progress)
+            except DeviceConflict:
+                # Номер устройства занят другой копией базы: новый номер и
+                # повтор; второй конфликт подряд уходит вызывающему
+                new_device(conn)
+                stats["device_renewed"] = True
+                exchange(conn, url, batch, stats, progress)
+            span.rows = stats["pushed"] + stats["pulled"]
+    finally:
+        conn.close()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def new_device(conn):
+    # Новый номер устройства для копии базы. Неотправленные изменения уйдут
+    # под новым номером (уже известные серверу применятся повторно без
+    # последствий), журнал сервера забирается с начала: изменения других
+    # копий под прежним номером этой копии не доходили.
+    migrate(conn)
+    with conn:
+        set_state(conn, "device", new_uid())
+        set_state(conn, "pulled", 0)
+
+
+# Сервер
+
+class SyncStore:
+    # Общий журнал изменений всех устройств; seq — порядок прихода
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        configure_connection(self.conn)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY,
+                device TEXT NOT NULL,
+                clock INTEGER NOT NULL,
+                uid TEXT NOT NULL,
+                op TEXT NOT NULL,
+                entry TEXT,
+                UNIQUE (device, clock)
+            );
+        ''')
+
+    def push(self, device, changes):
+        rows = [(device, change["clock"], change["uid"], change["op"],
+                 json.dumps(change["entry"], ensure_ascii=False) if change.get("entry") else None)
+                for change in changes]
+        with self.lock, self.conn:
+            for row in rows:
+                known = self.conn.execute("SELECT uid, op FROM changes WHERE device = ? AND clock = ?",
+                                          row[:2]).fetchone()
+                if known is not None and known != row[2:4]:
+                    # Тот же номер и время, другое изменение: копия базы
+                    # под чужим номером устройства; пачка не принимается
+                    raise DeviceConflict(f"изменение {row[1]} устройства уже получено от другой копии базы")
+            before = self.conn.total_changes
+            # Повтор пачки после обрыва связи ничего не дублирует
+            self.conn.executemany('''
+                INSERT OR IGNORE INTO changes (device, clock, uid, op, entry) VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            return self.conn.total_changes - before
+
+    def pull(self, device, since, limit):
+        # Свои изменения устройства — без текста записи: клиент только
+        # сверяет их со своим журналом
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT seq, device, clock, uid, op, CASE WHEN device = ? THEN NULL ELSE entry END
+                FROM changes WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (device, since, limit)).fetchall()
+        more = len(rows) == limit
+        seq = rows[-1][0] if rows else since
+        changes = []
+        for row_seq, row_device, clock, uid, op, entry in rows:
+            change = {"device": row_device, "clock": clock, "uid": uid, "op": op}
+            if entry is not None:
+                change["entry"] = json.loads(entry)
+            changes.append(change)
+        return {"changes": changes, "seq": seq, "more": more}
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        address = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(address.query))
+        try:
+            device = params["device"]
+            if address.path == "/push" and self.command == "POST":
+                body = decode(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                result = {"accepted": self.store.push(device, body["changes"])}
+            elif address.path == "/pull" and self.command == "GET":
+                result = self.store.pull(device, int(params.get("since", 0)),
+                                         min(int(params.get("limit", SYNC_BATCH)), SYNC_BATCH))
+            else:
+                self.reply(404, {"error": "not found"})
+                return
+        except DeviceConflict as e:
+            self.reply(409, {"error": str(e)})
+            return
+        except (KeyError, ValueError, OSError) as e:
+            self.reply(400, {"error": str(e)})
+            return
+        self.reply(200, result)
+
+    def reply(self, status, payload):
+        body = encode(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(store_path=SERVER_STORE, host="127.0.0.1", port=SERVER_PORT):
+    # port=0 — свободный порт (тесты, бенчмарки): server.server_address[1]
+    handler = type("Handler", (SyncHandler,), {"store": SyncStore(store_path)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синхронизация дневника Psihoz между устройствами")
+    parser.add_argument("command", choices=("sync", "serve", "new-device"))
+    parser.add_argument("--db", default="psihoz.db")
+    parser.add_argument("--url", default=SYNC_URL)
+    parser.add_argument("--store", default=SERVER_STORE, help="база сервера (serve)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = make_server(args.store, args.host, args.port)
+        print(f"Сервер синхронизации: http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    elif args.command == "new-device":
+        conn = sqlite3.connect(args.db)
+        new_device(conn)
+        conn.close()
+        print("Новый номер устройства назначен")
+    else:
+        def show(pushed, pulled):
+            print(f"\rотправлено {pushed}, получено {pulled}", end="", file=sys.stderr)
+
+        stats = sync(args.db, args.url, progress=show)
+        print(f"\nОтправлено: {stats['pushed']}, получено: {stats['pulled']}, "
+              f"применено: {stats['applied']}, {stats['sent_bytes'] // 1024} КБ / "
+              f"{stats['received_bytes'] // 1024} КБ, {stats['seconds']} с")
+        if stats['device_renewed']:
+            print("Номер устройства совпадал с другой копией базы: назначен новый")
@@ -0,0 +1,214 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import psihoz_perf
+from psihoz_db import configure_connection
+
+# Фоновый поток для работы с базой данных и аналитикой.
+# У потока своё соединение SQLite; задачи выполняются строго по очереди,
+# поэтому чтение, поставленное после записи, видит её результат.
+# Результаты забирает главный поток через poll() (вызывается из root.after).
+# Каждая задача замеряется (psihoz_perf): ожидание в очереди и выполнение.
+#
+# Запись отложенная (write-behind): задачи write() выполняются в общей
+# открытой транзакции, каждая в своей точке сохранения, а commit делается
+# группой — после GROUP_COMMIT_SIZE записей или через GROUP_COMMIT_MS после
+# первой. Чтение в этом же потоке видит ещё не зафиксированные записи.
+# stop() фиксирует всё перед выходом; flush() — по требованию (перед
+# работой другого соединения с базой, например пересчётом).
+# Неудачный групповой commit (база занята, диск заполнен) не останавливает
+# поток: транзакция остаётся открытой и повторяется через GROUP_COMMIT_MS,
+# ошибка передаётся в on_error (первая из подряд идущих).
+
+GROUP_COMMIT_SIZE = 50
+GROUP_COMMIT_MS = 500
+
+
+class DbWorker:
+    def __init__(self, db_path, on_error=None):
+        self.db_path = db_path
+        self.on_error = on_error
+        self.exit_error = None      # commit при выходе не удался
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.generations = {}
+        self.pending = 0
+        # Состояние группового commit (меняется только в потоке worker)
+        self.writes = 0
+        self.first_write = None
+        self.commit_failed = False
+        self.thread = threading.Thread(target=self.run, name="psihoz-db", daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, channel=None, callback=None, error=None, write=False):
+        # Новая задача в том же канале делает старые задачи канала устаревшими:
+        # если они ещё в очереди, они пропускаются, а их результат не доставляется.
+        # Задачи без канала (запись) никогда не отменяются.
+        with self.lock:
+            generation = self.generations.get(channel, 0) + 1
+            if channel is not None:
+                self.generations[channel] = generation
+            self.pending += 1
+        self.jobs.put((channel, generation, func, args, callback, error, write, time.perf_counter()))
+
+    def write(self, func, *args, callback=None, error=None):
+        # Изменение данных: callback вызывается, когда запись видна чтению
+        # через worker; на диск она попадает с ближайшим групповым commit
+        self.submit(func, *args, callback=callback, error=error, write=True)
+
+    def flush(self, callback=None, error=None):
+        self.submit(self.commit, callback=callback, error=error)
+
+    def spawn(self, func, *args, channel=None, callback=None, error=None):
+        # Долгая задача (пересчёт, импорт) в отдельном потоке, чтобы не
+        # задерживать очередь; результат доставляется тем же poll().
+        # Канал работает как в submit: доставляется только результат последней задачи.
+        with self.lock:
+            generation = self.generations.get(channel, 0) + 1
+            if channel is not None:
+                self.generations[channel] = generation
+            self.pending += 1
+
+        def target():
+            try:
+                with psihoz_perf.timed(f"spawn.{job_name(func)}"):
+                    result = func(*args)
+                self.results.put((channel, generation, callback, result))
+            except Exception as e:
+                self.results.put((channel, generation, error, e))
+
+        threading.Thread(target=target, daemon=True).start()
+
+    def cancel(self, channel):
+        with self.lock:
+            self.generations[channel] = self.generations.get(channel, 0) + 1
+
+    def is_current(self, channel, generation):
+        if channel is None:
+            return True
+        with self.lock:
+            return self.generations.get(channel) == generation
+
+    def busy(self):
+        with self.lock:
+            return self.pending > 0
+
+    def commit(self, conn):
+        if conn.in_transaction:
+            with psihoz_perf.timed("worker.commit") as span:
+                span.rows = self.writes
+                conn.commit()
+        self.writes = 0
+        self.first_write = None
+        self.commit_failed = False
+
+    def group_commit(self, conn):
+        # commit по размеру или времени группы; при ошибке записи группы
+        # остаются в открытой транзакции до следующей попытки
+        try:
+            self.commit(conn)
+            return None
+        except Exception as e:
+            if conn.in_transaction:
+                self.first_write = time.perf_counter()
+            else:
+                # SQLite сам откатил транзакцию: записи группы потеряны
+                self.writes = 0
+                self.first_write = None
+            if not self.commit_failed and self.on_error is not None:
+                with self.lock:
+                    self.pending += 1
+                self.results.put((None, 0, self.on_error, e))
+            self.commit_failed = True
+            return e
+
+    def commit_timeout(self):
+        # Сколько ждать следующую задачу до commit по времени (None — без срока)
+        if self.first_write is None:
+            return None
+        return max(GROUP_COMMIT_MS / 1000 - (time.perf_counter() - self.first_write), 0)
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path)
+        configure_connection(conn)
+        while True:
+            try:
+                job = self.jobs.get(timeout=self.commit_timeout())
+            except queue.Empty:
+                self.group_commit(conn)
+                continue
+            if job is None:
+                break
+            channel, generation, func, args, callback, error, write, queued = job
+            if not self.is_current(channel, generation):
+                self.results.put((channel, generation, None, None))
+                continue
+            psihoz_perf.record("worker.wait", (time.perf_counter() - queued) * 1000)
+
+            # Внутри общей транзакции каждая задача — точка сохранения:
+            # ошибка откатывает только её, а не всю группу
+            if write and not conn.in_transaction:
+                conn.execute("BEGIN")
+            savepoint = conn.in_transaction
+            if savepoint:
+                conn.execute("SAVEPOINT job")
+            try:
+                with psihoz_perf.timed(f"db.{job_name(func)}") as span:
+                    result = func(conn, *args)
+                    if isinstance(result, list):
+                        span.rows = len(result)
+            except Exception as e:
+                if savepoint and conn.in_transaction:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                if conn.in_transaction and not self.writes:
+                    # В группе нет удачных записей (например, упала первая):
+                    # транзакция не должна держать блокировку до следующей записи
+                    conn.rollback()
+                self.results.put((channel, generation, error, e))
+                continue
+
+            if not conn.in_transaction:
+                # Задача сама сделала commit (например, миграция)
+                self.writes = 0
+                self.first_write = None
+            elif savepoint:
+                conn.execute("RELEASE job")
+            if write:
+                self.writes += 1
+                if self.first_write is None:
+                    self.first_write = time.perf_counter()
+                if self.writes >= GROUP_COMMIT_SIZE and not self.commit_failed:
+                    self.group_commit(conn)
+            self.results.put((channel, generation, callback, result))
+
+        # Выход: всё отложенное фиксируется до закрытия соединения
+        self.exit_error = self.group_commit(conn)
+        conn.close()
+
+    def poll(self):
+        # Вызывается в главном потоке: доставляет готовые результаты
+        while True:
+            try:
+                channel, generation, handler, value = self.results.get_nowait()
+            except queue.Empty:
+                return
+            with self.lock:
+                self.pending -= 1
+            if handler is not None and self.is_current(channel, generation):
+                handler(value)
+
+    def stop(self, timeout=None):
+        # Чтение из очереди больше не нужно; запись выполняется и фиксируется
+        with self.lock:
+            for channel in self.generations:
+                self.generations[channel] += 1
+        self.jobs.put(None)
+        self.thread.join(timeout)
+
+
+def job_name(func):
+    return getattr(func, "__name__", "job")
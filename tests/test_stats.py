@@ -0,0 +1,63 @@
+import numpy as np
+
+from psihoz_stats import RollingStats
+
+DAY = 86400
+START = 20000 * DAY + 10 * 3600     # 10:00, день 20000 от 1970-01-01
+
+
+def columns(rows):
+    ts, moods, sentiment = zip(*rows)
+    return (np.array(ts, dtype=np.int64), np.array(moods, dtype=np.int64),
+            np.array([np.nan if value is None else value for value in sentiment]))
+
+
+def rebuild(rows):
+    return RollingStats.from_columns(*columns(rows)).snapshot()
+
+
+def assert_same(stats, rows):
+    expected = rebuild(rows)
+    actual = stats.snapshot()
+    for key in ('entries', 'streak_current', 'streak_longest'):
+        assert actual[key] == expected[key], key
+    for (days, count, mean, std), (_, want_count, want_mean, want_std) in zip(actual['windows'],
+                                                                              expected['windows']):
+        assert count == want_count, days
+        if want_mean is None:
+            assert mean is None, days
+        else:
+            assert np.isclose(mean, want_mean) and np.isclose(std, want_std, atol=1e-7), days
+
+
+ROWS = [
+    (START, 1, 0.4),
+    (START + DAY, 3, -0.5),
+    (START + 2 * DAY, 4, -0.6),
+    (START + 2 * DAY + 3600, 3, None),
+    (START + 3 * DAY, 4, -0.002),
+]
+
+
+def test_delete_newest_entry_matches_rebuild():
+    stats = RollingStats.from_columns(*columns(ROWS))
+    stats.add(*ROWS[-1], sign=-1)
+    assert_same(stats, ROWS[:-1])
+
+
+def test_insert_and_delete_on_new_day_matches_rebuild():
+    stats = RollingStats.from_columns(*columns(ROWS))
+    later = (START + 6 * DAY, 0, 0.9)
+    stats.add(*later)
+    assert_same(stats, ROWS + [later])
+    stats.add(*later, sign=-1)
+    assert_same(stats, ROWS)
+
+
+def test_delete_everything_then_add():
+    stats = RollingStats.from_columns(*columns(ROWS))
+    for row in reversed(ROWS):
+        stats.add(*row, sign=-1)
+    assert stats.snapshot()['windows'][0][1] == 0
+    stats.add(*ROWS[0])
+    assert_same(stats, ROWS[:1])